@@ -1,10 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, Response, g, render_template, request, redirect, url_for, jsonify
 from controllers.automate_duty import AutomateDutyController
-
+from models.ksb import KSBIndex, is_ksb_code_list, parse_ksbs, parse_ksb_code
+from catalogue import create_catalogue_cli
+from encoding import JSON, compress, encode, media_types
+from replicas import STICKY_COOKIE, ReadReplica, ReplicaSession, reset_replica, use_replica
+from search import install_search_index, search_catalogue
+from standards import (StandardRouter, current_standard, default_standard,
+                       parse_databases, parse_standard, reset_standard, use_standard)
+
+import click
 import uuid
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event, inspect, or_
+from sqlalchemy.orm import Session, validates, with_loader_criteria
 
+import json
 import os
+import time
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,25 +26,35 @@ app = Flask(__name__)
 
 if not app.config.get("SQLALCHEMY_DATABASE_URI"):
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_URL")
+app.config.setdefault("COIN_DOCUMENTS", os.getenv("COIN_DOCUMENTS", "false").lower() == "true")
+app.config.setdefault("READ_YOUR_WRITES_SECONDS", float(os.getenv("READ_YOUR_WRITES_SECONDS", 5)))
 
 duties= []
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={"class_": ReplicaSession})
+app.extensions["standards"] = StandardRouter(parse_databases(os.getenv("STANDARD_DATABASES")))
+app.extensions["read_replica"] = ReadReplica(os.getenv("DB_READ_URL"))
 
 coin_duties = db.Table('coin_duties',
     db.Column('coin_id', db.String(36), db.ForeignKey('coins.id'), primary_key=True),
-    db.Column('duty_id', db.String(36), db.ForeignKey('duties.id'), primary_key=True)
+    db.Column('duty_id', db.String(36), db.ForeignKey('duties.id'), primary_key=True),
+    db.Index('ix_coin_duties_duty_id', 'duty_id')
 )
 
 duty_ksb = db.Table('duty_ksb',
     db.Column('duty_id', db.String(36), db.ForeignKey('duties.id'), primary_key=True),
-    db.Column('ksb_id', db.String(36), db.ForeignKey('ksbs.id'), primary_key=True)
+    db.Column('ksb_id', db.String(36), db.ForeignKey('ksbs.id'), primary_key=True),
+    db.Index('ix_duty_ksb_ksb_id', 'ksb_id')
 )
 
-class Coin(db.Model):
+class StandardMixin:
+    standard = db.Column(db.String(50), nullable=False, default=default_standard)
+
+class Coin(StandardMixin, db.Model):
     __tablename__ = "coins"
+    __table_args__ = (db.UniqueConstraint('standard', 'coin_name'),)
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    coin_name = db.Column(db.String(100), nullable=False, unique=True)
+    coin_name = db.Column(db.String(100), nullable=False)
 
     duties = db.relationship('Duty', secondary=coin_duties, backref='coins')
 
@@ -42,11 +65,12 @@ class Coin(db.Model):
             "duties": [d.to_dict() for d in self.duties]
         }
 
-class Duty(db.Model):
+class Duty(StandardMixin, db.Model):
     __tablename__ = "duties"
+    __table_args__ = (db.UniqueConstraint('standard', 'duty_name'), db.UniqueConstraint('standard', 'description'))
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    duty_name = db.Column(db.String(100), nullable=False, unique=True)
-    description = db.Column(db.String(200), nullable=False, unique=True)
+    duty_name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.String(200), nullable=False)
 
     ksbs = db.relationship('KSB', secondary=duty_ksb, backref='ksbs')
 
@@ -58,11 +82,23 @@ class Duty(db.Model):
             "ksbs": [k.to_dict() for k in self.ksbs]
         }
 
-class KSB(db.Model):
+class KSB(StandardMixin, db.Model):
     __tablename__ = "ksbs"
+    __table_args__ = (
+        db.UniqueConstraint('standard', 'ksb_name'),
+        db.UniqueConstraint('standard', 'description'),
+        db.Index('ix_ksbs_standard_code', 'standard', 'code')
+    )
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    ksb_name = db.Column(db.String(100), nullable=False, unique=True)
-    description = db.Column(db.String(200), nullable=False, unique=True)
+    ksb_name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.String(200), nullable=False)
+    code = db.Column(db.String(10))
+
+    @validates('ksb_name')
+    def set_code(self, key, ksb_name):
+        code = parse_ksb_code(ksb_name)
+        self.code = str(code) if code else None
+        return ksb_name
 
     def to_dict(self):
         return {
@@ -71,11 +107,398 @@ class KSB(db.Model):
             "description": self.description
         }
 
+install_search_index(db.metadata)
+
+@event.listens_for(Session, 'do_orm_execute')
+def scope_to_standard(execute_state):
+    standard = current_standard()
+    if not standard or execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if execute_state.is_select or execute_state.is_update or execute_state.is_delete:
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(StandardMixin, lambda cls: cls.standard == standard, include_aliases=True)
+        )
+
+catalogue_version = db.Table('catalogue_version',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('version', db.Integer, nullable=False)
+)
+event.listen(catalogue_version, 'after_create', DDL("INSERT INTO catalogue_version (id, version) VALUES (1, 0)"))
+
+changes = db.Table('changes',
+    db.Column('seq', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('entity', db.String(20), nullable=False),
+    db.Column('op', db.String(10), nullable=False),
+    db.Column('entity_id', db.String(80), nullable=False),
+    db.Column('data', db.Text),
+    db.Column('standard', db.String(50)),
+    db.Column('changed_at', db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+)
+
+CHANGE_ENTITIES = {
+    Coin: ("coin", ["id", "coin_name"]),
+    Duty: ("duty", ["id", "duty_name", "description"]),
+    KSB: ("ksb", ["id", "ksb_name", "description"]),
+}
+
+CHANGE_ASSOCIATIONS = [
+    (Coin, "duties", "coin_duty", "coin_id", "duty_id"),
+    (Duty, "ksbs", "duty_ksb", "duty_id", "ksb_id"),
+]
+
+def association_change(entity, op, left, right, left_id, right_id):
+    return (entity, op, f"{left_id}:{right_id}", {left: left_id, right: right_id})
+
+def record_changes(connection, entries):
+    if not entries:
+        return
+
+    # The version row is locked until commit, so sequence numbers become visible in order
+    connection.execute(catalogue_version.update().values(version=catalogue_version.c.version + len(entries)))
+    first_seq = connection.execute(db.select(catalogue_version.c.version)).scalar() - len(entries) + 1
+
+    connection.execute(changes.insert(), [
+        {
+            "seq": first_seq + offset,
+            "entity": entity,
+            "op": op,
+            "entity_id": entity_id,
+            "data": json.dumps(data) if data is not None else None,
+            "standard": current_standard()
+        }
+        for offset, (entity, op, entity_id, data) in enumerate(entries)
+    ])
+
+@event.listens_for(Session, 'after_flush')
+def capture_changes(session, flush_context):
+    entries = []
+
+    for op, items in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for item in items:
+            if type(item) not in CHANGE_ENTITIES:
+                continue
+
+            entity, columns = CHANGE_ENTITIES[type(item)]
+            if op == "delete":
+                entries.append((entity, op, item.id, None))
+                continue
+            if op == "insert" or session.is_modified(item, include_collections=False):
+                entries.append((entity, op, item.id, {column: getattr(item, column) for column in columns}))
+
+            for model, attribute, association, left, right in CHANGE_ASSOCIATIONS:
+                if isinstance(item, model):
+                    history = inspect(item).attrs[attribute].history
+                    entries += [association_change(association, "insert", left, right, item.id, other.id) for other in history.added]
+                    entries += [association_change(association, "delete", left, right, item.id, other.id) for other in history.deleted]
+
+    record_changes(session.connection(), entries)
+
+coin_documents = db.Table('coin_documents',
+    db.Column('coin_id', db.String(36), primary_key=True),
+    db.Column('document', db.Text, nullable=False)
+)
+
+def chunks(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def coins_with_duties(connection, duty_ids):
+    coin_ids = set()
+    for chunk in chunks(duty_ids):
+        coin_ids.update(connection.execute(
+            db.select(coin_duties.c.coin_id).where(coin_duties.c.duty_id.in_(chunk))
+        ).scalars())
+    return coin_ids
+
+def coins_with_ksbs(connection, ksb_ids):
+    duty_ids = set()
+    for chunk in chunks(ksb_ids):
+        duty_ids.update(connection.execute(
+            db.select(duty_ksb.c.duty_id).where(duty_ksb.c.ksb_id.in_(chunk))
+        ).scalars())
+    return coins_with_duties(connection, duty_ids)
+
+def build_coin_documents(connection, coin_ids):
+    documents = {}
+    for chunk in chunks(coin_ids):
+        coin_rows = connection.execute(db.select(Coin.id, Coin.coin_name).where(Coin.id.in_(chunk)))
+        coins = {row.id: {"id": row.id, "coin_name": row.coin_name, "duties": []} for row in coin_rows}
+
+        duty_rows = connection.execute(
+            db.select(coin_duties.c.coin_id, Duty.id, Duty.duty_name, Duty.description)
+            .join(Duty, Duty.id == coin_duties.c.duty_id)
+            .where(coin_duties.c.coin_id.in_(chunk))
+        ).all()
+        duties = {}
+        for row in duty_rows:
+            duties.setdefault(row.id, {"id": row.id, "duty_name": row.duty_name, "description": row.description, "ksbs": []})
+            coins[row.coin_id]["duties"].append(duties[row.id])
+
+        for duty_chunk in chunks(duties):
+            ksb_rows = connection.execute(
+                db.select(duty_ksb.c.duty_id, KSB.id, KSB.ksb_name, KSB.description)
+                .join(KSB, KSB.id == duty_ksb.c.ksb_id)
+                .where(duty_ksb.c.duty_id.in_(duty_chunk))
+            )
+            for row in ksb_rows:
+                duties[row.duty_id]["ksbs"].append({"id": row.id, "ksb_name": row.ksb_name, "description": row.description})
+
+        documents.update({coin_id: json.dumps(coin) for coin_id, coin in coins.items()})
+    return documents
+
+def rebuild_coin_documents(connection, coin_ids=None):
+    if coin_ids is None:
+        connection.execute(coin_documents.delete())
+        coin_ids = connection.execute(db.select(Coin.id)).scalars().all()
+    else:
+        for chunk in chunks(coin_ids):
+            connection.execute(coin_documents.delete().where(coin_documents.c.coin_id.in_(chunk)))
+
+    documents = build_coin_documents(connection, coin_ids)
+    if documents:
+        connection.execute(coin_documents.insert(), [
+            {"coin_id": coin_id, "document": document} for coin_id, document in documents.items()
+        ])
+
+@event.listens_for(Session, 'before_flush')
+def collect_deleted_coin_documents(session, flush_context, instances):
+    if not app.config["COIN_DOCUMENTS"]:
+        return
+
+    # Association rows of deleted duties and KSBs are gone after the flush, so look up their coins now
+    connection = session.connection()
+    affected = session.info.setdefault('coin_documents', set())
+    affected.update(coins_with_duties(connection, [i.id for i in session.deleted if isinstance(i, Duty)]))
+    affected.update(coins_with_ksbs(connection, [i.id for i in session.deleted if isinstance(i, KSB)]))
+
+@event.listens_for(Session, 'after_flush')
+def update_coin_documents(session, flush_context):
+    if not app.config["COIN_DOCUMENTS"]:
+        return
+
+    connection = session.connection()
+    changed = list(session.new) + list(session.dirty)
+    affected = session.info.pop('coin_documents', set())
+    affected.update(i.id for i in changed if isinstance(i, Coin))
+    affected.update(coins_with_duties(connection, [i.id for i in changed if isinstance(i, Duty)]))
+    affected.update(coins_with_ksbs(connection, [i.id for i in changed if isinstance(i, KSB)]))
+    affected.difference_update(i.id for i in session.deleted if isinstance(i, Coin))
+
+    for chunk in chunks([i.id for i in session.deleted if isinstance(i, Coin)]):
+        connection.execute(coin_documents.delete().where(coin_documents.c.coin_id.in_(chunk)))
+    if affected:
+        rebuild_coin_documents(connection, affected)
+
+def backfill_ksb_codes(connection):
+    # Rows written before the code column existed have no code, so filters and code lookups missed them
+    rows = connection.execute(db.select(KSB.id, KSB.ksb_name).where(KSB.code.is_(None))).all()
+    codes = [{"ksb_id": row.id, "ksb_code": str(code)} for row in rows if (code := parse_ksb_code(row.ksb_name))]
+    for chunk in chunks(codes):
+        connection.execute(
+            KSB.__table__.update().where(KSB.id == db.bindparam("ksb_id")).values(code=db.bindparam("ksb_code")),
+            chunk
+        )
+    return len(codes)
+
+@app.cli.command('init-db')
+def init_db_command():
+    db.create_all()
+    app.extensions["standards"].create_all(db.metadata)
+
+    standards = app.extensions["standards"]
+    for engine in [db.engine] + [standards.engine(standard) for standard in standards.databases]:
+        with engine.begin() as connection:
+            backfilled = backfill_ksb_codes(connection)
+        if backfilled:
+            click.echo(f"Filled in {backfilled} missing KSB codes")
+
+@app.cli.command('rebuild-coin-documents')
+def rebuild_coin_documents_command():
+    rebuild_coin_documents(db.session.connection())
+    db.session.commit()
+
+def reload_catalogue(connection):
+    # Imported rows bypass the ORM change capture, so replicas are told to load everything again
+    record_changes(connection, [("catalogue", "reload", "*", None)])
+    if app.config["COIN_DOCUMENTS"]:
+        rebuild_coin_documents(connection)
+
+app.cli.add_command(create_catalogue_cli(db, on_import=reload_catalogue))
+
 duties = []
+ksb_index = KSBIndex()
+
+def ksb_values(ksbs):
+    # A string of codes such as "K1, S2 B3" is split into its codes; any other string is one KSB name
+    if isinstance(ksbs, str):
+        if is_ksb_code_list(ksbs):
+            return [str(code) for code in parse_ksbs(ksbs)]
+        return [ksbs.strip()] if ksbs.strip() else []
+    return ksbs
+
+def find_ksb(value):
+    code = parse_ksb_code(value)
+    if code:
+        ksb = KSB.query.filter_by(code=str(code)).first()
+        if ksb:
+            return ksb
+    return KSB.query.filter_by(ksb_name=value).first()
+
+def ksb_code_arg():
+    code = parse_ksb_code(request.args['ksb'])
+    return str(code) if code else request.args['ksb']
+
+def response_mimetype():
+    return request.accept_mimetypes.best_match(media_types(), default=JSON)
+
+def items_response(items):
+    mimetype = response_mimetype()
+    if mimetype == JSON:
+        response = jsonify(items)
+    else:
+        response = Response(encode(items, mimetype), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def list_response(query, order_by):
+    if 'page' not in request.args:
+        return items_response([item.to_dict() for item in query.all()])
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    total = query.order_by(None).count()
+    items = query.order_by(order_by).limit(per_page).offset((page - 1) * per_page).all()
+
+    response = items_response([item.to_dict() for item in items])
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+def options_response(name_column):
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    query = db.session.query(name_column.class_.id, name_column)
+    prefix = request.args.get('q', '').strip()
+    if prefix:
+        query = query.filter(name_column.istartswith(prefix, autoescape=True))
+    rows = query.order_by(name_column).limit(limit)
+    return jsonify([{"id": row[0], "name": row[1]} for row in rows])
+
+ASSOCIATION_TABLES = {
+    "coin_duty": (coin_duties, "coin_id", "duty_id"),
+    "duty_ksb": (duty_ksb, "duty_id", "ksb_id"),
+}
+
+def resolve_duty_ids(names):
+    names = list(dict.fromkeys(names))
+    ids = {}
+    for chunk in chunks(names):
+        rows = db.session.execute(db.select(Duty.id, Duty.duty_name).where(Duty.duty_name.in_(chunk)))
+        ids.update({row.duty_name: row.id for row in rows})
+    if len(ids) < len(names):
+        return None
+    return ids
+
+def resolve_ksb_ids(values):
+    values = list(dict.fromkeys(ksb_values(values)))
+    codes = {}
+    for value in values:
+        code = parse_ksb_code(value)
+        if code:
+            codes[value] = str(code)
+
+    by_code, by_name = {}, {}
+    for chunk in chunks(values):
+        chunk_codes = [codes[value] for value in chunk if value in codes]
+        rows = db.session.execute(
+            db.select(KSB.id, KSB.ksb_name, KSB.code).where(or_(KSB.ksb_name.in_(chunk), KSB.code.in_(chunk_codes)))
+        )
+        for row in rows:
+            by_name[row.ksb_name] = row.id
+            if row.code:
+                by_code.setdefault(row.code, row.id)
+
+    ids = {}
+    for value in values:
+        ksb_id = by_code.get(codes.get(value)) or by_name.get(value)
+        if ksb_id is None:
+            return None
+        ids[value] = ksb_id
+    return ids
+
+def association_request(value, resolve):
+    # A list replaces the whole set, {"add": [...], "remove": [...]} patches it
+    if isinstance(value, dict):
+        add = resolve(value.get('add', []))
+        remove = resolve(value.get('remove', []))
+        if add is None or remove is None:
+            return None
+        return {"add": set(add.values()), "remove": set(remove.values())}
+
+    replace = resolve(value)
+    if replace is None:
+        return None
+    return {"replace": set(replace.values())}
+
+def update_association(association, left_id, add=(), remove=(), replace=None):
+    table, left, right = ASSOCIATION_TABLES[association]
+    current = set(db.session.execute(db.select(table.c[right]).where(table.c[left] == left_id)).scalars())
+    if replace is not None:
+        add, remove = replace - current, current - replace
+    else:
+        add, remove = set(add) - current, set(remove) & current
+
+    if not add and not remove:
+        return
+
+    for chunk in chunks(remove):
+        db.session.execute(table.delete().where(table.c[left] == left_id, table.c[right].in_(chunk)))
+    if add:
+        db.session.execute(table.insert(), [{left: left_id, right: right_id} for right_id in add])
+
+    # Bulk statements bypass the flush hooks, so record their side effects here
+    connection = db.session.connection()
+    record_changes(connection, (
+        [association_change(association, "insert", left, right, left_id, right_id) for right_id in sorted(add)] +
+        [association_change(association, "delete", left, right, left_id, right_id) for right_id in sorted(remove)]
+    ))
+    if app.config["COIN_DOCUMENTS"]:
+        coin_ids = [left_id] if association == "coin_duty" else coins_with_duties(connection, [left_id])
+        rebuild_coin_documents(connection, coin_ids)
+
+@app.before_request
+def set_standard():
+    standard = parse_standard(request.headers.get('X-Standard') or request.args.get('standard'))
+    if standard is None:
+        return jsonify({"error": "Invalid standard"}), 400
+    g.standard_token = use_standard(standard)
+
+@app.before_request
+def route_reads():
+    # Clients that have just written read from the primary until the replica has caught up
+    sticky = request.cookies.get(STICKY_COOKIE, 0, type=float) > time.time()
+    g.replica_token = use_replica(request.method in ('GET', 'HEAD') and not sticky)
+
+@app.after_request
+def stick_to_primary(response):
+    if request.method not in ('GET', 'HEAD') and response.status_code < 400:
+        seconds = app.config["READ_YOUR_WRITES_SECONDS"]
+        response.set_cookie(STICKY_COOKIE, str(time.time() + seconds), max_age=int(seconds), httponly=True, samesite='Lax')
+    return response
+
+@app.teardown_request
+def clear_standard(error):
+    if 'standard_token' in g:
+        reset_standard(g.pop('standard_token'))
+    if 'replica_token' in g:
+        reset_replica(g.pop('replica_token'))
+
+@app.after_request
+def compress_response(response):
+    return compress(response, request.accept_encodings)
 
 @app.route('/')
 def index():
-    return render_template("automate_duty.html", duties=duties)
+    return render_template("automate_duty.html", duties=duties, upload_errors=request.args.getlist('upload_error'))
 
 @app.route('/create-duties', methods=['POST'])
 def create_duties():
@@ -85,13 +508,126 @@ def create_duties():
 
     duty = AutomateDutyController.create_duties(number, description, ksbs)
     duties.append(duty)
+    ksb_index.add(duty.id, duty.ksb_codes)
 
     return redirect(url_for('index'))
 
+def batch_error(upload, body, max_messages=10):
+    # Form uploads go back to the duty page with the errors listed; API clients get them as JSON
+    if not upload:
+        return jsonify(body), 400
+
+    if "error" in body:
+        messages = [body["error"]]
+    else:
+        messages = [f"Record {error['index'] + 1}: {error['error']}" for error in body["errors"]]
+        if len(messages) > max_messages:
+            messages = messages[:max_messages] + [f"and {len(messages) - max_messages} more"]
+    return redirect(url_for('index', upload_error=messages))
+
+@app.post('/create-duties/batch')
+def create_duties_batch():
+    upload = request.files.get('file')
+    if upload:
+        file_format = upload.filename.rsplit('.', 1)[-1].lower()
+        try:
+            # utf-8-sig drops the byte order mark Excel writes at the start of CSV files
+            records = AutomateDutyController.parse_duty_records(upload.read().decode('utf-8-sig'), file_format)
+        except ValueError as error:
+            return batch_error(upload, {"error": str(error)})
+    else:
+        records = request.get_json(silent=True)
+        if isinstance(records, dict):
+            records = records.get('duties')
+
+    if not isinstance(records, list):
+        return batch_error(upload, {"error": "Expected a list of duties"})
+
+    created, errors = AutomateDutyController.create_duties_batch(records, [d.number for d in duties])
+    if errors:
+        return batch_error(upload, {"errors": errors})
+
+    duties.extend(created)
+    for duty in created:
+        ksb_index.add(duty.id, duty.ksb_codes)
+
+    if upload:
+        return redirect(url_for('index'))
+    return jsonify([d.to_dict() for d in created]), 201
+
+@app.get('/automate-duties')
+def get_automate_duties():
+    if 'ksb' in request.args:
+        duty_ids = ksb_index.lookup(request.args['ksb'])
+        return jsonify([d.to_dict() for d in duties if d.id in duty_ids])
+    return jsonify([d.to_dict() for d in duties])
+
+@app.get('/version')
+def get_version():
+    version = db.session.execute(db.select(catalogue_version.c.version)).scalar()
+    return jsonify({"version": version})
+
+@app.get('/changes')
+def get_changes():
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 1000)
+
+    rows = db.session.execute(
+        db.select(changes)
+        .where(changes.c.seq > since, or_(changes.c.standard == current_standard(), changes.c.standard.is_(None)))
+        .order_by(changes.c.seq)
+        .limit(limit)
+    )
+    last_seq = db.session.execute(db.select(catalogue_version.c.version)).scalar()
+
+    return jsonify({
+        "changes": [
+            {
+                "seq": row.seq,
+                "entity": row.entity,
+                "op": row.op,
+                "id": row.entity_id,
+                "data": json.loads(row.data) if row.data else None
+            }
+            for row in rows
+        ],
+        "last_seq": last_seq
+    })
+
+@app.get('/search')
+def search():
+    types = request.args.get('type')
+    results = search_catalogue(
+        db.session,
+        request.args.get('q', ''),
+        types=types.split(',') if types else None,
+        limit=min(max(request.args.get('limit', 20, type=int), 1), 100),
+        standard=current_standard()
+    )
+    return jsonify(results)
+
 @app.route('/coins', methods=['GET'])
 def get_coins():
-    coins = Coin.query.all()
-    return jsonify([c.to_dict() for c in coins])
+    if 'ksb' in request.args:
+        coins = Coin.query.join(Coin.duties).join(Duty.ksbs).filter(KSB.code == ksb_code_arg()).distinct()
+    elif app.config["COIN_DOCUMENTS"] and 'page' not in request.args:
+        documents = db.session.execute(
+            db.select(coin_documents.c.document)
+            .join(Coin, Coin.id == coin_documents.c.coin_id)
+            .where(Coin.standard == current_standard())
+        ).scalars()
+        if response_mimetype() != JSON:
+            return items_response([json.loads(document) for document in documents])
+        response = Response("[" + ",".join(documents) + "]", mimetype="application/json")
+        response.vary.add('Accept')
+        return response
+    else:
+        coins = Coin.query
+    return list_response(coins, Coin.coin_name)
+
+@app.get('/coins/options')
+def get_coin_options():
+    return options_response(Coin.coin_name)
 
 @app.post('/coins')
 def create_coin():
@@ -119,25 +655,33 @@ def create_coin():
 
 @app.route('/coins/<string:coin_id>', methods=['GET'])
 def get_single_coin(coin_id):
+    if app.config["COIN_DOCUMENTS"]:
+        document = db.session.execute(
+            db.select(coin_documents.c.document)
+            .join(Coin, Coin.id == coin_documents.c.coin_id)
+            .where(coin_documents.c.coin_id == coin_id, Coin.standard == current_standard())
+        ).scalar()
+        if document:
+            return Response(document, mimetype="application/json")
+
     coin = Coin.query.get_or_404(coin_id)
     return jsonify(coin.to_dict())
 
-@app.route('/coins/<string:coin_id>', methods=['PUT'])
+@app.route('/coins/<string:coin_id>', methods=['PUT', 'PATCH'])
 def update_coin(coin_id):
     coin = Coin.query.get_or_404(coin_id)
     data = request.get_json()
+
+    if 'duties' in data:
+        duty_ids = association_request(data['duties'], resolve_duty_ids)
+        if duty_ids is None:
+            return jsonify({"error": "Duty does not exist"}), 404
     
     if 'coin_name' in data:
         coin.coin_name = data['coin_name']
     
     if 'duties' in data:
-        coin.duties = [] 
-        for duty_name in data['duties']:
-            duty = Duty.query.filter_by(duty_name=duty_name).first()
-            if duty:
-                coin.duties.append(duty)
-            else:
-                return jsonify({"error": "Duty does not exist"}), 404
+        update_association("coin_duty", coin.id, **duty_ids)
             
     db.session.commit()
 
@@ -152,8 +696,15 @@ def delete_coin(coin_id):
 
 @app.route('/duties', methods=['GET'])
 def get_duties():
-    duties = Duty.query.all()
-    return jsonify([d.to_dict() for d in duties])
+    if 'ksb' in request.args:
+        duties = Duty.query.join(Duty.ksbs).filter(KSB.code == ksb_code_arg())
+    else:
+        duties = Duty.query
+    return list_response(duties, Duty.duty_name)
+
+@app.get('/duties/options')
+def get_duty_options():
+    return options_response(Duty.duty_name)
 
 @app.post('/duties')
 def create_duty():
@@ -166,8 +717,8 @@ def create_duty():
     new_duty = Duty(duty_name=data['duty_name'], description=data['description'])
     
     if 'ksbs' in data:
-        for ksb_name in data['ksbs']:
-            ksb = KSB.query.filter_by(ksb_name=ksb_name).first()
+        for ksb_name in ksb_values(data['ksbs']):
+            ksb = find_ksb(ksb_name)
             if ksb:
                 new_duty.ksbs.append(ksb)
             else:
@@ -183,22 +734,21 @@ def get_single_duty(duty_id):
     duty = Duty.query.get_or_404(duty_id)
     return jsonify(duty.to_dict())
 
-@app.route('/duties/<string:duty_id>', methods=['PUT'])
+@app.route('/duties/<string:duty_id>', methods=['PUT', 'PATCH'])
 def update_duty(duty_id):
     duty = Duty.query.get_or_404(duty_id)
     data = request.get_json()
+
+    if 'ksbs' in data:
+        ksb_ids = association_request(data['ksbs'], resolve_ksb_ids)
+        if ksb_ids is None:
+            return jsonify({"error": "KSB does not exist"}), 404
     
     if 'duty_name' in data:
         duty.duty_name = data['duty_name']
 
     if 'ksbs' in data:
-        duty.ksbs = [] 
-        for ksb_name in data['ksbs']:
-            ksb = KSB.query.filter_by(ksb_name=ksb_name).first()
-            if ksb:
-                duty.ksbs.append(ksb)
-            else:
-                return jsonify({"error": "KSB does not exist"}), 404
+        update_association("duty_ksb", duty.id, **ksb_ids)
 
     db.session.commit()
 
@@ -216,8 +766,11 @@ def delete_duty(duty_id):
 
 @app.route('/ksbs', methods=['GET'])
 def get_ksbs():
-    ksbs = KSB.query.all()
-    return jsonify([k.to_dict() for k in ksbs])
+    return list_response(KSB.query, KSB.ksb_name)
+
+@app.get('/ksbs/options')
+def get_ksb_options():
+    return options_response(KSB.ksb_name)
 
 @app.post('/ksbs')
 def create_ksb():
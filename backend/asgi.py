@@ -0,0 +1,419 @@
+import json
+import os
+import re
+from urllib.parse import parse_qs
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from app import Coin, Duty, KSB, catalogue_version, changes, ksb_values
+from models.ksb import parse_ksb_code
+from search import search_catalogue
+from standards import current_standard, parse_standard, reset_standard, use_standard
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+COIN_LOAD = [selectinload(Coin.duties).selectinload(Duty.ksbs)]
+DUTY_LOAD = [selectinload(Duty.ksbs), selectinload(Duty.coins)]
+KSB_LOAD = [selectinload(KSB.ksbs)]
+
+class HTTPError(Exception):
+    def __init__(self, status, body):
+        super().__init__(status, body)
+        self.status = status
+        self.body = body
+
+class Request:
+    def __init__(self, method, path, query, body, headers=()):
+        self.method = method
+        self.path = path
+        self.args = {key: values[0] for key, values in parse_qs(query).items()}
+        self.body = body
+        self.headers = {name.decode().lower(): value.decode() for name, value in headers}
+
+    def get_json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, {"error": "Invalid JSON"})
+
+    def int_arg(self, name, default):
+        try:
+            return int(self.args.get(name, default))
+        except ValueError:
+            return default
+
+def async_database_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS and ("+" not in url.drivername or url.drivername.endswith("+psycopg2")):
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url
+
+async def get_or_404(session, model, id, options):
+    item = await session.get(model, id, options=options, populate_existing=True)
+    if item is None:
+        raise HTTPError(404, "Not Found")
+    return item
+
+async def find_by_name(session, column, name, options=()):
+    result = await session.execute(select(column.class_).filter(column == name).options(*options))
+    return result.scalars().first()
+
+async def find_ksb(session, value):
+    code = parse_ksb_code(value)
+    if code:
+        result = await session.execute(select(KSB).filter_by(code=str(code)))
+        ksb = result.scalars().first()
+        if ksb:
+            return ksb
+    return await find_by_name(session, KSB.ksb_name, value)
+
+async def find_duty(session, value):
+    return await find_by_name(session, Duty.duty_name, value)
+
+async def find_all(session, values, find):
+    items = []
+    for value in dict.fromkeys(values):
+        item = await find(session, value)
+        if not item:
+            return None
+        if item not in items:
+            items.append(item)
+    return items
+
+async def update_collection(session, collection, value, find):
+    # A list replaces the whole set, {"add": [...], "remove": [...]} patches it
+    if isinstance(value, dict):
+        add = await find_all(session, value.get('add', []), find)
+        remove = await find_all(session, value.get('remove', []), find)
+        if add is None or remove is None:
+            return False
+        collection.extend(item for item in add if item not in collection)
+        for item in remove:
+            if item in collection:
+                collection.remove(item)
+        return True
+
+    replace = await find_all(session, value, find)
+    if replace is None:
+        return False
+    collection[:] = replace
+    return True
+
+def ksb_code_arg(request):
+    code = parse_ksb_code(request.args['ksb'])
+    return str(code) if code else request.args['ksb']
+
+async def list_items(session, request, query, order_by):
+    headers = {}
+    if "page" in request.args:
+        page = max(request.int_arg("page", 1), 1)
+        per_page = min(max(request.int_arg("per_page", 20), 1), 100)
+        total = await session.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+        query = query.order_by(order_by).limit(per_page).offset((page - 1) * per_page)
+        headers["x-total-count"] = str(total)
+    result = await session.execute(query)
+    return 200, [item.to_dict() for item in result.scalars()], headers
+
+async def options_items(session, request, name_column):
+    limit = min(max(request.int_arg("limit", 20), 1), 100)
+    query = select(name_column.class_.id, name_column)
+    prefix = request.args.get("q", "").strip()
+    if prefix:
+        query = query.filter(name_column.istartswith(prefix, autoescape=True))
+    rows = await session.execute(query.order_by(name_column).limit(limit))
+    return 200, [{"id": row[0], "name": row[1]} for row in rows]
+
+async def get_version(session, request):
+    return 200, {"version": await session.scalar(select(catalogue_version.c.version))}
+
+async def get_changes(session, request):
+    since = request.int_arg("since", 0)
+    limit = min(max(request.int_arg("limit", 500), 1), 1000)
+
+    rows = await session.execute(
+        select(changes)
+        .where(changes.c.seq > since, or_(changes.c.standard == current_standard(), changes.c.standard.is_(None)))
+        .order_by(changes.c.seq)
+        .limit(limit)
+    )
+    last_seq = await session.scalar(select(catalogue_version.c.version))
+
+    return 200, {
+        "changes": [
+            {
+                "seq": row.seq,
+                "entity": row.entity,
+                "op": row.op,
+                "id": row.entity_id,
+                "data": json.loads(row.data) if row.data else None
+            }
+            for row in rows
+        ],
+        "last_seq": last_seq
+    }
+
+async def search(session, request):
+    types = request.args.get("type")
+    results = await session.run_sync(
+        search_catalogue,
+        request.args.get("q", ""),
+        types=types.split(",") if types else None,
+        limit=min(max(request.int_arg("limit", 20), 1), 100),
+        standard=current_standard()
+    )
+    return 200, results
+
+async def get_coins(session, request):
+    query = select(Coin).options(*COIN_LOAD)
+    if "ksb" in request.args:
+        query = query.join(Coin.duties).join(Duty.ksbs).filter(KSB.code == ksb_code_arg(request)).distinct()
+    return await list_items(session, request, query, Coin.coin_name)
+
+async def get_coin_options(session, request):
+    return await options_items(session, request, Coin.coin_name)
+
+async def create_coin(session, request):
+    data = request.get_json()
+
+    if await find_by_name(session, Coin.coin_name, data['coin_name']):
+        return 400, {"error": "Coin already exists"}
+
+    new_coin = Coin(coin_name=data['coin_name'], duties=[])
+    session.add(new_coin)
+
+    for duty_name in data.get('duties', []):
+        duty = await find_duty(session, duty_name)
+        if not duty:
+            return 404, {"error": "Duty does not exist"}
+        new_coin.duties.append(duty)
+
+    await session.commit()
+
+    return 201, (await get_or_404(session, Coin, new_coin.id, COIN_LOAD)).to_dict()
+
+async def get_single_coin(session, request, coin_id):
+    return 200, (await get_or_404(session, Coin, coin_id, COIN_LOAD)).to_dict()
+
+async def update_coin(session, request, coin_id):
+    coin = await get_or_404(session, Coin, coin_id, COIN_LOAD)
+    data = request.get_json()
+
+    if 'duties' in data and not await update_collection(session, coin.duties, data['duties'], find_duty):
+        return 404, {"error": "Duty does not exist"}
+
+    if 'coin_name' in data:
+        coin.coin_name = data['coin_name']
+
+    await session.commit()
+
+    return 200, (await get_or_404(session, Coin, coin_id, COIN_LOAD)).to_dict()
+
+async def delete_coin(session, request, coin_id):
+    coin = await get_or_404(session, Coin, coin_id, COIN_LOAD)
+    await session.delete(coin)
+    await session.commit()
+    return 200, "Coin successfully deleted"
+
+async def get_duties(session, request):
+    query = select(Duty).options(selectinload(Duty.ksbs))
+    if "ksb" in request.args:
+        query = query.join(Duty.ksbs).filter(KSB.code == ksb_code_arg(request))
+    return await list_items(session, request, query, Duty.duty_name)
+
+async def get_duty_options(session, request):
+    return await options_items(session, request, Duty.duty_name)
+
+async def create_duty(session, request):
+    data = request.get_json()
+
+    if await find_by_name(session, Duty.duty_name, data['duty_name']):
+        return 400, {"error": "Duty already exists"}
+
+    new_duty = Duty(duty_name=data['duty_name'], description=data['description'], ksbs=[], coins=[])
+    session.add(new_duty)
+
+    for ksb_name in ksb_values(data.get('ksbs', [])):
+        ksb = await find_ksb(session, ksb_name)
+        if not ksb:
+            return 404, {"error": "KSB does not exist"}
+        new_duty.ksbs.append(ksb)
+
+    await session.commit()
+
+    return 201, (await get_or_404(session, Duty, new_duty.id, DUTY_LOAD)).to_dict()
+
+async def get_single_duty(session, request, duty_id):
+    return 200, (await get_or_404(session, Duty, duty_id, DUTY_LOAD)).to_dict()
+
+async def update_duty(session, request, duty_id):
+    duty = await get_or_404(session, Duty, duty_id, DUTY_LOAD)
+    data = request.get_json()
+
+    if 'ksbs' in data:
+        ksbs = data['ksbs']
+        if isinstance(ksbs, dict):
+            ksbs = {key: ksb_values(values) for key, values in ksbs.items()}
+        else:
+            ksbs = ksb_values(ksbs)
+        if not await update_collection(session, duty.ksbs, ksbs, find_ksb):
+            return 404, {"error": "KSB does not exist"}
+
+    if 'duty_name' in data:
+        duty.duty_name = data['duty_name']
+
+    await session.commit()
+
+    return 200, (await get_or_404(session, Duty, duty_id, DUTY_LOAD)).to_dict()
+
+async def delete_duty(session, request, duty_id):
+    duty = await get_or_404(session, Duty, duty_id, DUTY_LOAD)
+    await session.delete(duty)
+    await session.commit()
+    return 200, "Duty successfully deleted"
+
+async def get_ksbs(session, request):
+    return await list_items(session, request, select(KSB), KSB.ksb_name)
+
+async def get_ksb_options(session, request):
+    return await options_items(session, request, KSB.ksb_name)
+
+async def create_ksb(session, request):
+    data = request.get_json()
+
+    if await find_by_name(session, KSB.ksb_name, data['ksb_name']):
+        return 400, {"error": "KSB already exists"}
+
+    new_ksb = KSB(ksb_name=data['ksb_name'], description=data['description'])
+    session.add(new_ksb)
+    await session.commit()
+
+    return 201, new_ksb.to_dict()
+
+async def get_single_ksb(session, request, ksb_id):
+    return 200, (await get_or_404(session, KSB, ksb_id, [])).to_dict()
+
+async def update_ksb(session, request, ksb_id):
+    ksb = await get_or_404(session, KSB, ksb_id, [])
+    data = request.get_json()
+
+    ksb.ksb_name = data['ksb_name']
+    await session.commit()
+
+    return 200, ksb.to_dict()
+
+async def delete_ksb(session, request, ksb_id):
+    ksb = await get_or_404(session, KSB, ksb_id, KSB_LOAD)
+    await session.delete(ksb)
+    await session.commit()
+    return 200, "KSB successfully deleted"
+
+PAGE_ARGS = {"page", "per_page"}
+OPTIONS_ARGS = {"q", "limit"}
+
+# Routes are matched in order, so /<entity>/options comes before /<entity>/<id>. The last field lists
+# the query parameters a route understands, besides `standard`.
+ROUTES = [
+    ("GET", r"/version", get_version, set()),
+    ("GET", r"/changes", get_changes, {"since", "limit"}),
+    ("GET", r"/search", search, {"q", "type", "limit"}),
+    ("GET", r"/coins", get_coins, PAGE_ARGS | {"ksb"}),
+    ("POST", r"/coins", create_coin, set()),
+    ("GET", r"/coins/options", get_coin_options, OPTIONS_ARGS),
+    ("GET", r"/coins/([^/]+)", get_single_coin, set()),
+    ("PUT", r"/coins/([^/]+)", update_coin, set()),
+    ("PATCH", r"/coins/([^/]+)", update_coin, set()),
+    ("DELETE", r"/coins/([^/]+)", delete_coin, set()),
+    ("GET", r"/duties", get_duties, PAGE_ARGS | {"ksb"}),
+    ("POST", r"/duties", create_duty, set()),
+    ("GET", r"/duties/options", get_duty_options, OPTIONS_ARGS),
+    ("GET", r"/duties/([^/]+)", get_single_duty, set()),
+    ("PUT", r"/duties/([^/]+)", update_duty, set()),
+    ("PATCH", r"/duties/([^/]+)", update_duty, set()),
+    ("DELETE", r"/duties/([^/]+)", delete_duty, set()),
+    ("GET", r"/ksbs", get_ksbs, PAGE_ARGS),
+    ("POST", r"/ksbs", create_ksb, set()),
+    ("GET", r"/ksbs/options", get_ksb_options, OPTIONS_ARGS),
+    ("GET", r"/ksbs/([^/]+)", get_single_ksb, set()),
+    ("PUT", r"/ksbs/([^/]+)", update_ksb, set()),
+    ("DELETE", r"/ksbs/([^/]+)", delete_ksb, set()),
+]
+ROUTES = [(method, re.compile(pattern), handler, args) for method, pattern, handler, args in ROUTES]
+
+def match_route(request):
+    path_matched = False
+    for route_method, pattern, handler, args in ROUTES:
+        match = pattern.fullmatch(request.path)
+        if match:
+            path_matched = True
+            if route_method == request.method:
+                break
+    else:
+        raise HTTPError(405 if path_matched else 404, "Method Not Allowed" if path_matched else "Not Found")
+
+    # Parameters the Flask app would act on must not be silently dropped here
+    unsupported = sorted(set(request.args) - args - {"standard"})
+    if unsupported:
+        raise HTTPError(400, {"error": f"Unsupported query parameter: {', '.join(unsupported)}"})
+    return handler, match.groups()
+
+async def read_body(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+async def send_response(send, status, body, headers=None):
+    if isinstance(body, str):
+        payload, content_type = body.encode(), b"text/html; charset=utf-8"
+    else:
+        payload, content_type = json.dumps(body).encode(), b"application/json"
+    raw_headers = [(b"content-type", content_type), (b"content-length", str(len(payload)).encode())]
+    raw_headers += [(name.encode(), value.encode()) for name, value in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": payload})
+
+def create_app(database_url, **engine_options):
+    engine = create_async_engine(async_database_url(database_url), **engine_options)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def application(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await engine.dispose()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        request = Request(scope["method"], scope["path"], scope["query_string"].decode(), await read_body(receive),
+                          scope.get("headers", ()))
+        standard = parse_standard(request.headers.get("x-standard") or request.args.get("standard"))
+        token = use_standard(standard)
+        try:
+            if standard is None:
+                raise HTTPError(400, {"error": "Invalid standard"})
+            handler, args = match_route(request)
+            async with sessions() as session:
+                status, body, *headers = await handler(session, request, *args)
+        except HTTPError as error:
+            status, body, headers = error.status, error.body, []
+        finally:
+            reset_standard(token)
+        await send_response(send, status, body, *headers)
+
+    application.engine = engine
+    return application
+
+application = create_app(os.getenv("DB_URL"))
@@ -0,0 +1,174 @@
+import csv
+import json
+import os
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.ksb import parse_ksb_code
+
+# tables in the order they can be inserted, with the record type used in JSONL files
+CATALOGUE_TABLES = [
+    ("ksb", "ksbs"),
+    ("duty", "duties"),
+    ("coin", "coins"),
+    ("coin_duty", "coin_duties"),
+    ("duty_ksb", "duty_ksb"),
+]
+TABLE_NAMES = dict(CATALOGUE_TABLES)
+FORMATS = ("jsonl", "csv")
+
+def guess_format(path):
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+def table_rows(connection, table, chunk_size):
+    # Rows are fetched through a server-side cursor where the driver has one, chunk_size at a time
+    result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(
+        select(table).order_by(*table.primary_key.columns)
+    )
+    for partition in result.mappings().partitions():
+        yield from partition
+
+def export_catalogue(connection, metadata, path, file_format="jsonl", chunk_size=1000):
+    counts = {}
+    if file_format == "jsonl":
+        with open(path, "w") as out:
+            for record_type, table_name in CATALOGUE_TABLES:
+                counts[table_name] = 0
+                for row in table_rows(connection, metadata.tables[table_name], chunk_size):
+                    out.write(json.dumps({"type": record_type, **row}) + "\n")
+                    counts[table_name] += 1
+        return counts
+
+    os.makedirs(path, exist_ok=True)
+    for _, table_name in CATALOGUE_TABLES:
+        table = metadata.tables[table_name]
+        counts[table_name] = 0
+        with open(os.path.join(path, f"{table_name}.csv"), "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=table.columns.keys())
+            writer.writeheader()
+            for row in table_rows(connection, table, chunk_size):
+                writer.writerow(row)
+                counts[table_name] += 1
+    return counts
+
+# (source, table name, row) for every record in file order; a source is a file the checkpoint tracks
+def read_records(path, file_format):
+    if file_format == "jsonl":
+        with open(path) as records:
+            for line in records:
+                if line.strip():
+                    record = json.loads(line)
+                    yield "jsonl", TABLE_NAMES[record.pop("type")], record
+        return
+
+    for _, table_name in CATALOGUE_TABLES:
+        file_path = os.path.join(path, f"{table_name}.csv")
+        if os.path.exists(file_path):
+            with open(file_path, newline="") as records:
+                for row in csv.DictReader(records):
+                    yield table_name, table_name, row
+
+def clean_row(table, row):
+    row = {key: value for key, value in row.items() if key in table.columns}
+    for column in table.columns:
+        # CSV has no null, so empty values of nullable columns are read back as None
+        if column.nullable and row.get(column.name) == "":
+            row[column.name] = None
+    if table.name == "ksbs" and not row.get("code"):
+        code = parse_ksb_code(row["ksb_name"])
+        row["code"] = str(code) if code else None
+    return row
+
+def insert_ignoring_existing(connection, table):
+    # Only a row with the same primary key counts as already imported; a clash with a different
+    # row on a unique name still fails
+    index_elements = [column.name for column in table.primary_key]
+    if connection.dialect.name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    if connection.dialect.name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    return table.insert()
+
+def load_checkpoint(checkpoint):
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as saved:
+            return json.load(saved)
+    return {}
+
+def save_checkpoint(checkpoint, position):
+    if checkpoint:
+        with open(f"{checkpoint}.tmp", "w") as saved:
+            json.dump(position, saved)
+        os.replace(f"{checkpoint}.tmp", checkpoint)
+
+# Each chunk is committed before the checkpoint moves past it, and rows that already exist are
+# skipped, so an interrupted import can simply be run again
+def import_catalogue(engine, metadata, path, file_format="jsonl", chunk_size=1000, checkpoint=None):
+    position = load_checkpoint(checkpoint)
+    counts = {table_name: 0 for _, table_name in CATALOGUE_TABLES}
+    batches = {table_name: [] for _, table_name in CATALOGUE_TABLES}
+    seen = {}
+
+    def flush():
+        with engine.begin() as connection:
+            for table_name, rows in batches.items():
+                if rows:
+                    result = connection.execute(insert_ignoring_existing(connection, metadata.tables[table_name]), rows)
+                    # Skipped rows are not counted; drivers that cannot report it get the batch size
+                    counts[table_name] += result.rowcount if result.rowcount >= 0 else len(rows)
+                    rows.clear()
+        position.update(seen)
+        save_checkpoint(checkpoint, position)
+
+    pending = 0
+    for source, table_name, row in read_records(path, file_format):
+        seen[source] = seen.get(source, 0) + 1
+        if seen[source] <= position.get(source, 0):
+            continue
+
+        batches[table_name].append(clean_row(metadata.tables[table_name], row))
+        pending += 1
+        if pending >= chunk_size:
+            flush()
+            pending = 0
+    flush()
+    return counts
+
+def create_catalogue_cli(db, on_import=None):
+    cli = AppGroup("catalogue", help="Export and import the coin, duty and KSB catalogue.")
+
+    @cli.command("export")
+    @click.argument("path")
+    @click.option("--format", "file_format", type=click.Choice(FORMATS), help="Defaults to jsonl for .jsonl paths, otherwise a directory of CSV files.")
+    @click.option("--chunk-size", default=1000, show_default=True)
+    def export_command(path, file_format, chunk_size):
+        with db.engine.connect() as connection:
+            counts = export_catalogue(connection, db.metadata, path, file_format or guess_format(path), chunk_size)
+        for table_name, count in counts.items():
+            click.echo(f"{table_name}: {count} rows")
+
+    @cli.command("import")
+    @click.argument("path")
+    @click.option("--format", "file_format", type=click.Choice(FORMATS), help="Defaults to jsonl for .jsonl paths, otherwise a directory of CSV files.")
+    @click.option("--chunk-size", default=1000, show_default=True)
+    @click.option("--checkpoint", help="Progress file used to resume an interrupted import. Defaults to PATH.checkpoint.")
+    def import_command(path, file_format, chunk_size, checkpoint):
+        checkpoint = checkpoint or f"{path.rstrip(os.sep)}.checkpoint"
+        try:
+            counts = import_catalogue(db.engine, db.metadata, path, file_format or guess_format(path), chunk_size, checkpoint)
+        except IntegrityError as error:
+            raise click.ClickException(
+                f"{error.orig}. Chunks before this one were imported; fix the file and run the import again to resume."
+            )
+        if on_import:
+            with db.engine.begin() as connection:
+                on_import(connection)
+        os.remove(checkpoint)
+        for table_name, count in counts.items():
+            click.echo(f"{table_name}: {count} rows")
+
+    return cli
@@ -1,5 +1,23 @@
+import csv
+import io
+import json
+
 from models.automate_duty import AutomateDuty
 
+DUTY_FIELDS = ("number", "description", "ksbs")
+
+def field_text(field, value):
+    # Returns None for values that cannot be stored as text, such as objects or nested lists
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if field == "ksbs" and isinstance(value, list) and all(isinstance(code, str) for code in value):
+        return " ".join(code.strip() for code in value)
+    return None
+
 class AutomateDutyController:
     @staticmethod
     def create_duties(number, description, ksbs):
@@ -9,3 +27,51 @@ class AutomateDutyController:
         duty.complete_status()
         return duty
 
+    @staticmethod
+    def parse_duty_records(content, file_format):
+        if file_format == "json":
+            records = json.loads(content)
+            if isinstance(records, dict):
+                records = records.get("duties", [])
+            return records
+        if file_format == "csv":
+            return list(csv.DictReader(io.StringIO(content)))
+        raise ValueError(f"Unsupported format: {file_format}")
+
+    @staticmethod
+    def create_duties_batch(records, existing_numbers=()):
+        errors = []
+        seen = set(existing_numbers)
+        duties = []
+
+        for index, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors.append({"index": index, "error": "Record must be an object"})
+                continue
+
+            values = {field: field_text(field, record.get(field)) for field in DUTY_FIELDS}
+            invalid = [field for field in DUTY_FIELDS if values[field] is None]
+            if invalid:
+                errors.append({"index": index, "error": f"Invalid {', '.join(invalid)}"})
+                continue
+
+            missing = [field for field in DUTY_FIELDS if not values[field]]
+            if missing:
+                errors.append({"index": index, "error": f"Missing {', '.join(missing)}"})
+                continue
+
+            # Later duplicates of the same duty number are dropped, not rejected
+            if values["number"] in seen:
+                continue
+            seen.add(values["number"])
+
+            duties.append(AutomateDuty(values["number"], values["description"], values["ksbs"]))
+
+        # The batch is all-or-nothing, so nothing is saved if any record is invalid
+        if errors:
+            return [], errors
+
+        AutomateDuty.save_all(duties)
+        for duty in duties:
+            duty.mark_complete()
+        return duties, []
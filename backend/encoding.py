@@ -0,0 +1,63 @@
+import gzip
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = "application/json"
+COMPACT_JSON = "application/vnd.catalogue.compact+json"
+MSGPACK = "application/msgpack"
+
+# nested lists replaced by id references in the compact shape, keyed by field name
+REFERENCES = ("duties", "ksbs")
+MIN_COMPRESS_SIZE = 500
+
+def media_types():
+    return [JSON, COMPACT_JSON] + ([MSGPACK] if msgpack else [])
+
+# Each nested duty and KSB is sent once, and the items refer to them by id
+def normalise(items):
+    document = {"items": []}
+
+    def collapse(item):
+        item = dict(item)
+        for key in REFERENCES:
+            if key in item:
+                table = document.setdefault(key, {})
+                for child in item[key]:
+                    if child["id"] not in table:
+                        table[child["id"]] = collapse(child)
+                item[key] = [child["id"] for child in item[key]]
+        return item
+
+    document["items"] = [collapse(item) for item in items]
+    return document
+
+def encode(items, mimetype):
+    if mimetype == MSGPACK:
+        return msgpack.packb(normalise(items))
+    return json.dumps(normalise(items), separators=(",", ":"))
+
+def compress(response, accept_encodings):
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    if brotli and "br" in accept_encodings:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif "gzip" in accept_encodings:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return int(status_line.split()[1]), headers.get("connection", "").lower() != "close"
+
+async def worker(url, deadline, latencies, errors):
+    parts = urlsplit(url)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    request = f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n\r\n".encode()
+    writer = None
+
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            start = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as error:
+            errors.append(type(error).__name__)
+            writer = None
+            await asyncio.sleep(0.01)
+
+    if writer is not None:
+        writer.close()
+
+async def run(url, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(worker(url, deadline, latencies, errors) for _ in range(concurrency)))
+    return latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="GET a backend URL from many concurrent keep-alive connections")
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    latencies, errors = asyncio.run(run(args.url, args.concurrency, args.duration))
+    latencies.sort()
+    print(f"requests: {len(latencies)}  errors: {len(errors)}  throughput: {len(latencies) / args.duration:.1f} req/s")
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"latency p50: {quantiles[49] * 1000:.1f} ms  p99: {quantiles[98] * 1000:.1f} ms  max: {latencies[-1] * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
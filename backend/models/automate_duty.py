@@ -1,5 +1,7 @@
 import uuid
 
+from models.ksb import parse_ksbs
+
 class AutomateDuty:
     def __init__(self, number, description, ksbs):
         self.id = str(uuid.uuid4())
@@ -8,9 +10,17 @@ class AutomateDuty:
         self.ksbs = ksbs
         self.complete = False
 
+    @property
+    def ksb_codes(self):
+        return parse_ksbs(self.ksbs)
+
     def save(self):
         return "Duty saved"
 
+    @staticmethod
+    def save_all(duties):
+        return f"{len(duties)} duties saved"
+
     def create_duty(self):
         return AutomateDuty(self.number, self.description, self.ksbs)
     
@@ -19,3 +29,12 @@ class AutomateDuty:
 
     def complete_status(self):
         return "Duty is complete"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "number": self.number,
+            "description": self.description,
+            "ksbs": self.ksbs,
+            "complete": self.complete
+        }
@@ -0,0 +1,52 @@
+import re
+from collections import namedtuple
+
+KSB_TYPES = "KSB"
+KSB_PATTERN = re.compile(r"\b([KSB])\s*0*(\d+)\b", re.IGNORECASE)
+KSB_SEPARATORS = re.compile(r"[\s,;/&]*")
+
+class KSBCode(namedtuple("KSBCode", ["type", "number"])):
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.type}{self.number}"
+
+def _sort_key(code):
+    return (KSB_TYPES.index(code.type), code.number)
+
+def parse_ksbs(text):
+    codes = {KSBCode(t.upper(), int(n)) for t, n in KSB_PATTERN.findall(text or "")}
+    return sorted(codes, key=_sort_key)
+
+def is_ksb_code_list(text):
+    # True when the text holds nothing but KSB codes and separators
+    return KSB_PATTERN.search(text or "") is not None and KSB_SEPARATORS.fullmatch(KSB_PATTERN.sub("", text)) is not None
+
+def parse_ksb_code(text):
+    match = KSB_PATTERN.fullmatch((text or "").strip())
+    if not match:
+        return None
+    return KSBCode(match.group(1).upper(), int(match.group(2)))
+
+class KSBIndex:
+    def __init__(self):
+        self._duties_by_code = {}
+        self._codes_by_duty = {}
+
+    def add(self, duty_id, codes):
+        self.remove(duty_id)
+        self._codes_by_duty[duty_id] = set(codes)
+        for code in codes:
+            self._duties_by_code.setdefault(code, set()).add(duty_id)
+
+    def remove(self, duty_id):
+        for code in self._codes_by_duty.pop(duty_id, ()):
+            duty_ids = self._duties_by_code[code]
+            duty_ids.discard(duty_id)
+            if not duty_ids:
+                del self._duties_by_code[code]
+
+    def lookup(self, code):
+        if isinstance(code, str):
+            code = parse_ksb_code(code)
+        return set(self._duties_by_code.get(code, ()))
@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import create_engine
+
+from standards import StandardSession
+
+STICKY_COOKIE = "read_primary_until"
+
+# Set for requests that only read, unless they follow a write by the same client
+_read_from_replica = ContextVar("read_from_replica", default=False)
+
+def reading_from_replica():
+    return _read_from_replica.get()
+
+def use_replica(flag):
+    return _read_from_replica.set(flag)
+
+def reset_replica(token):
+    _read_from_replica.reset(token)
+
+class ReadReplica:
+    def __init__(self, url=None):
+        self.url = url
+        self._engine = None
+        self._lock = Lock()
+
+    def configure(self, url):
+        self.dispose()
+        self.url = url
+
+    @property
+    def engine(self):
+        if not self.url:
+            return None
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_engine(self.url)
+            return self._engine
+
+    def dispose(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
+class ReplicaSession(StandardSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        # Standards on their own database keep reading from it
+        if bind is None and reading_from_replica() and engine is self._db.engine:
+            return current_app.extensions["read_replica"].engine or engine
+        return engine
@@ -0,0 +1,101 @@
+import re
+
+from sqlalchemy import DDL, event, text
+
+from standards import DEFAULT_STANDARD
+
+# name column(s) searched for each entity, keyed by table name
+SEARCH_COLUMNS = {
+    "coins": ("coin", ["coin_name"]),
+    "duties": ("duty", ["duty_name", "description"]),
+    "ksbs": ("ksb", ["ksb_name", "description"]),
+}
+
+def _tsvector(columns):
+    return "to_tsvector('simple', " + " || ' ' || ".join(f"coalesce({c}, '')" for c in columns) + ")"
+
+def _sqlite_ddl(table, columns):
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_values});"
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='rowid')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+    ]
+
+def install_search_index(metadata):
+    for table_name, (_, columns) in SEARCH_COLUMNS.items():
+        table = metadata.tables[table_name]
+        for statement in _sqlite_ddl(table_name, columns):
+            event.listen(table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+        event.listen(table, "after_drop", DDL(f"DROP TABLE IF EXISTS {table_name}_fts").execute_if(dialect="sqlite"))
+
+        index = f"CREATE INDEX IF NOT EXISTS ix_{table_name}_search ON {table_name} USING gin ({_tsvector(columns)})"
+        event.listen(table, "after_create", DDL(index).execute_if(dialect="postgresql"))
+
+def _terms(query):
+    return re.findall(r"\w+", query or "")
+
+def _sqlite_search(terms, tables):
+    match = " ".join(f'"{term}"*' for term in terms)
+    selects = []
+    for table_name in tables:
+        entity, columns = SEARCH_COLUMNS[table_name]
+        description = "t.description" if "description" in columns else "''"
+        selects.append(
+            f"SELECT '{entity}' AS type, t.id AS id, t.{columns[0]} AS name, {description} AS description, "
+            f"bm25({table_name}_fts) AS rank "
+            f"FROM {table_name}_fts JOIN {table_name} t ON t.rowid = {table_name}_fts.rowid "
+            f"WHERE {table_name}_fts MATCH :match AND t.standard = :standard"
+        )
+    return " UNION ALL ".join(selects) + " ORDER BY rank LIMIT :limit", match
+
+def _postgres_search(terms, tables):
+    match = " & ".join(f"{term}:*" for term in terms)
+    selects = []
+    for table_name in tables:
+        entity, columns = SEARCH_COLUMNS[table_name]
+        description = "t.description" if "description" in columns else "''"
+        vector = _tsvector(columns)
+        selects.append(
+            f"SELECT '{entity}' AS type, t.id AS id, t.{columns[0]} AS name, {description} AS description, "
+            f"-ts_rank({vector}, q) AS rank "
+            f"FROM {table_name} t, to_tsquery('simple', :match) q WHERE {vector} @@ q AND t.standard = :standard"
+        )
+    return " UNION ALL ".join(selects) + " ORDER BY rank LIMIT :limit", match
+
+def _like_search(terms, tables):
+    selects = []
+    for table_name in tables:
+        entity, columns = SEARCH_COLUMNS[table_name]
+        description = "t.description" if "description" in columns else "''"
+        selects.append(
+            f"SELECT '{entity}' AS type, t.id AS id, t.{columns[0]} AS name, {description} AS description, "
+            f"0 AS rank FROM {table_name} t WHERE lower(t.{columns[0]}) LIKE :match AND t.standard = :standard"
+        )
+    return " UNION ALL ".join(selects) + " LIMIT :limit", " ".join(terms).lower() + "%"
+
+def search_catalogue(session, query, types=None, limit=20, standard=DEFAULT_STANDARD):
+    terms = _terms(query)
+    tables = [t for t, (entity, _) in SEARCH_COLUMNS.items() if not types or entity in types]
+    if not terms or not tables:
+        return []
+
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        sql, match = _sqlite_search(terms, tables)
+    elif dialect == "postgresql":
+        sql, match = _postgres_search(terms, tables)
+    else:
+        sql, match = _like_search(terms, tables)
+
+    rows = session.execute(text(sql), {"match": match, "limit": limit, "standard": standard})
+    return [
+        {"type": row.type, "id": row.id, "name": row.name, "description": row.description}
+        for row in rows
+    ]
@@ -0,0 +1,91 @@
+import json
+import re
+from contextvars import ContextVar
+from threading import Lock
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+DEFAULT_STANDARD = "default"
+STANDARD_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,49}")
+
+# None outside a request, where maintenance code sees every standard
+_current_standard = ContextVar("standard", default=None)
+
+def parse_standard(value):
+    if not value:
+        return DEFAULT_STANDARD
+    value = value.strip().lower()
+    return value if STANDARD_PATTERN.fullmatch(value) else None
+
+def current_standard():
+    return _current_standard.get()
+
+def use_standard(standard):
+    return _current_standard.set(standard)
+
+def reset_standard(token):
+    _current_standard.reset(token)
+
+def default_standard():
+    return current_standard() or DEFAULT_STANDARD
+
+def parse_databases(value):
+    # STANDARD_DATABASES is a JSON object of standard -> database URL
+    return json.loads(value) if value else {}
+
+# Standards listed in `databases` get their own database; a URL with a `schema` query parameter
+# keeps the standard in that Postgres schema through the connections' search_path. Every other
+# standard shares the default database and is kept apart by the `standard` column.
+class StandardRouter:
+    def __init__(self, databases=None):
+        self.databases = dict(databases or {})
+        self._engines = {}
+        self._lock = Lock()
+
+    def configure(self, databases):
+        self.dispose()
+        self.databases = dict(databases)
+
+    def schema(self, standard):
+        return make_url(self.databases[standard]).query.get("schema")
+
+    def engine(self, standard):
+        if standard not in self.databases:
+            return None
+        with self._lock:
+            if standard not in self._engines:
+                url = make_url(self.databases[standard])
+                schema = url.query.get("schema")
+                if schema:
+                    url = url.difference_update_query(["schema"])
+                    self._engines[standard] = create_engine(url, connect_args={"options": f"-csearch_path={schema}"})
+                else:
+                    self._engines[standard] = create_engine(url)
+            return self._engines[standard]
+
+    def create_all(self, metadata):
+        for standard in self.databases:
+            engine = self.engine(standard)
+            schema = self.schema(standard)
+            if schema:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+            metadata.create_all(engine)
+
+    def dispose(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+class StandardSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            standard = current_standard()
+            engine = current_app.extensions["standards"].engine(standard) if standard else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
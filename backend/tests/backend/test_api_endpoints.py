@@ -1,11 +1,18 @@
 import pytest
 import os
 
+import gzip
+import io
+import json
 import uuid
+from urllib.parse import parse_qs, urlparse
 
 os.environ["DB_URL"] = "sqlite:///:memory:"
 
-from app import app, db, Coin, Duty, KSB
+from sqlalchemy import event
+
+from app import app, db, Coin, Duty, KSB, rebuild_coin_documents
+from encoding import COMPACT_JSON, MSGPACK
 
 @pytest.fixture()
 def client():
@@ -504,4 +511,534 @@ class TestDutiesAndKSBs:
 
         assert response.status_code == 404
         assert "KSB does not exist" in response.json["error"]
-        
\ No newline at end of file
+        
+class TestAutomateDutyBatch:
+    def test_create_duties_batch_from_json(self, client):
+        duty_data = [
+            {"number": "Batch 1", "description": "A description", "ksbs": "K1 S1"},
+            {"number": "Batch 2", "description": "Another description", "ksbs": "B1"},
+            {"number": "Batch 1", "description": "A duplicate", "ksbs": "K2"}
+        ]
+        response = client.post("/create-duties/batch", json=duty_data)
+
+        assert response.status_code == 201
+        assert [d["number"] for d in response.json] == ["Batch 1", "Batch 2"]
+        assert all(d["complete"] for d in response.json)
+
+    def test_create_duties_batch_from_csv_upload(self, client):
+        content = b"number,description,ksbs\nUpload 1,A description,K1\nUpload 2,Another description,S1\n"
+        response = client.post(
+            "/create-duties/batch",
+            data={"file": (io.BytesIO(content), "duties.csv")},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 302
+
+    def test_create_duties_batch_from_csv_with_byte_order_mark(self, client):
+        content = "number,description,ksbs\nBOM 1,A description,K1\n".encode("utf-8-sig")
+        response = client.post(
+            "/create-duties/batch",
+            data={"file": (io.BytesIO(content), "duties.csv")},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 302
+        assert "upload_error" not in response.location
+        assert "BOM 1" in [d["number"] for d in client.get("/automate-duties").json]
+
+    def test_create_duties_batch_upload_errors_redirect_to_the_form(self, client):
+        content = b"number,description,ksbs\nUpload error 1,A description,\n"
+        response = client.post(
+            "/create-duties/batch",
+            data={"file": (io.BytesIO(content), "duties.csv")},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 302
+        assert parse_qs(urlparse(response.location).query)["upload_error"] == ["Record 1: Missing ksbs"]
+
+    def test_create_duties_batch_unsupported_upload_redirects_to_the_form(self, client):
+        response = client.post(
+            "/create-duties/batch",
+            data={"file": (io.BytesIO(b"number"), "duties.txt")},
+            content_type="multipart/form-data"
+        )
+
+        assert response.status_code == 302
+        assert parse_qs(urlparse(response.location).query)["upload_error"] == ["Unsupported format: txt"]
+
+    def test_create_duties_batch_with_invalid_record_fails(self, client):
+        duty_data = [{"number": "Invalid 1", "description": "A description"}]
+        response = client.post("/create-duties/batch", json=duty_data)
+
+        assert response.status_code == 400
+        assert response.json["errors"][0]["index"] == 0
+
+    def test_create_duties_batch_without_list_fails(self, client):
+        response = client.post("/create-duties/batch", json={"number": "1"})
+
+        assert response.status_code == 400
+        assert "Expected a list of duties" in response.json["error"]
+
+class TestKSBCodes:
+    def create_ksbs(self, client):
+        client.post("/ksbs", json={"ksb_name": "K4", "description": "Knowledge four"})
+        client.post("/ksbs", json={"ksb_name": "S14", "description": "Skill fourteen"})
+        client.post("/ksbs", json={"ksb_name": "B2", "description": "Behaviour two"})
+
+    def test_ksb_code_is_normalised(self, client):
+        client.post("/ksbs", json={"ksb_name": "s014", "description": "Skill fourteen"})
+
+        with app.app_context():
+            assert KSB.query.filter_by(code="S14").one().ksb_name == "s014"
+
+    def test_create_duty_with_free_text_ksbs(self, client):
+        self.create_ksbs(client)
+
+        duty_data = {"duty_name": "A duty", "description": "A description", "ksbs": "K4, s14\n\nB2"}
+        response = client.post("/duties", json=duty_data)
+
+        assert response.status_code == 201
+        assert sorted(k["ksb_name"] for k in response.json["ksbs"]) == ["B2", "K4", "S14"]
+
+    def test_create_duty_with_unknown_ksb_code_fails(self, client):
+        self.create_ksbs(client)
+
+        duty_data = {"duty_name": "A duty", "description": "A description", "ksbs": "K4 K5"}
+        response = client.post("/duties", json=duty_data)
+
+        assert response.status_code == 404
+        assert "KSB does not exist" in response.json["error"]
+
+    def test_ksb_text_that_is_not_codes_is_one_name(self, client):
+        self.create_ksbs(client)
+        client.post("/ksbs", json={"ksb_name": "Teamwork", "description": "Works with others"})
+
+        response = client.post("/duties", json={"duty_name": "A duty", "description": "A description", "ksbs": "Teamwork"})
+
+        assert response.status_code == 201
+        assert [k["ksb_name"] for k in response.json["ksbs"]] == ["Teamwork"]
+
+    def test_unknown_ksb_text_fails_instead_of_clearing_ksbs(self, client):
+        self.create_ksbs(client)
+        duty = client.post("/duties", json={"duty_name": "A duty", "description": "A description", "ksbs": ["K4"]}).json
+
+        assert client.post("/duties", json={"duty_name": "Another duty", "description": "Another description", "ksbs": "Knowledge four"}).status_code == 404
+        response = client.put(f"/duties/{duty['id']}", json={"ksbs": "Knowledge four"})
+
+        assert response.status_code == 404
+        assert "KSB does not exist" in response.json["error"]
+        assert [k["ksb_name"] for k in client.get(f"/duties/{duty['id']}").json["ksbs"]] == ["K4"]
+
+    def test_get_duties_by_ksb(self, client):
+        self.create_ksbs(client)
+        client.post("/duties", json={"duty_name": "A duty", "description": "A description", "ksbs": ["K4", "S14"]})
+        client.post("/duties", json={"duty_name": "Another duty", "description": "Another description", "ksbs": ["B2"]})
+
+        response = client.get("/duties?ksb=s14")
+
+        assert response.status_code == 200
+        assert [d["duty_name"] for d in response.json] == ["A duty"]
+
+    def test_get_coins_by_ksb(self, client):
+        self.create_ksbs(client)
+        client.post("/duties", json={"duty_name": "A duty", "description": "A description", "ksbs": ["K4", "S14"]})
+        client.post("/duties", json={"duty_name": "Another duty", "description": "Another description", "ksbs": ["S14"]})
+        client.post("/coins", json={"coin_name": "A coin", "duties": ["A duty", "Another duty"]})
+        client.post("/coins", json={"coin_name": "Another coin"})
+
+        response = client.get("/coins?ksb=S14")
+
+        assert response.status_code == 200
+        assert [c["coin_name"] for c in response.json] == ["A coin"]
+
+    def test_get_automate_duties_by_ksb(self, client):
+        client.post("/create-duties", data={"number": "KSB 1", "description": "A description", "ksbs": "K4 S14"})
+        client.post("/create-duties", data={"number": "KSB 2", "description": "A description", "ksbs": "B2"})
+
+        response = client.get("/automate-duties?ksb=S14")
+
+        assert response.status_code == 200
+        assert [d["number"] for d in response.json] == ["KSB 1"]
+
+class TestSearch:
+    def create_catalogue(self, client):
+        client.post("/ksbs", json={"ksb_name": "K4", "description": "Infrastructure as code"})
+        client.post("/duties", json={"duty_name": "Automate infrastructure", "description": "Script and code", "ksbs": ["K4"]})
+        client.post("/coins", json={"coin_name": "Infrastructure coin", "duties": ["Automate infrastructure"]})
+        client.post("/coins", json={"coin_name": "Testing coin"})
+
+    def test_search_without_query_is_empty(self, client):
+        response = client.get("/search")
+
+        assert response.status_code == 200
+        assert response.json == []
+
+    def test_search_across_tables(self, client):
+        self.create_catalogue(client)
+
+        response = client.get("/search?q=infrastructure")
+
+        assert response.status_code == 200
+        assert sorted(r["type"] for r in response.json) == ["coin", "duty", "ksb"]
+
+    def test_search_matches_prefixes(self, client):
+        self.create_catalogue(client)
+
+        response = client.get("/search?q=Infra coi")
+
+        assert response.status_code == 200
+        assert [r["name"] for r in response.json] == ["Infrastructure coin"]
+
+    def test_search_filters_by_type(self, client):
+        self.create_catalogue(client)
+
+        response = client.get("/search?q=infra&type=coin")
+
+        assert [r["name"] for r in response.json] == ["Infrastructure coin"]
+
+    def test_search_follows_updates_and_deletes(self, client):
+        self.create_catalogue(client)
+        coin_id = client.get("/search?q=testing").json[0]["id"]
+
+        client.put(f"/coins/{coin_id}", json={"coin_name": "Quality coin"})
+        assert client.get("/search?q=testing").json == []
+        assert client.get("/search?q=quality").json[0]["id"] == coin_id
+
+        client.delete(f"/coins/{coin_id}")
+        assert client.get("/search?q=quality").json == []
+
+    @pytest.mark.parametrize("limit", [-1, 0])
+    def test_search_limit_is_at_least_one(self, client, limit):
+        self.create_catalogue(client)
+
+        response = client.get(f"/search?q=infrastructure&limit={limit}")
+
+        assert response.status_code == 200
+        assert len(response.json) == 1
+
+class TestPaginationAndOptions:
+    def test_get_coins_paginated(self, client):
+        for name in ["C coin", "A coin", "B coin"]:
+            client.post("/coins", json={"coin_name": name})
+
+        response = client.get("/coins?page=2&per_page=2")
+
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "3"
+        assert [c["coin_name"] for c in response.json] == ["C coin"]
+
+    def test_get_duties_paginated(self, client):
+        client.post("/duties", json={"duty_name": "B duty", "description": "B description"})
+        client.post("/duties", json={"duty_name": "A duty", "description": "A description"})
+
+        response = client.get("/duties?page=1&per_page=1")
+
+        assert response.headers["X-Total-Count"] == "2"
+        assert [d["duty_name"] for d in response.json] == ["A duty"]
+
+    def test_get_duty_options_by_prefix(self, client):
+        client.post("/duties", json={"duty_name": "Automate", "description": "A description"})
+        client.post("/duties", json={"duty_name": "Audit", "description": "Another description"})
+        duty = client.post("/duties", json={"duty_name": "Deploy", "description": "More description"}).json
+
+        response = client.get("/duties/options?q=au")
+
+        assert response.status_code == 200
+        assert [o["name"] for o in response.json] == ["Audit", "Automate"]
+        assert client.get("/duties/options?q=dep").json == [{"id": duty["id"], "name": "Deploy"}]
+
+    def test_get_ksb_options_limit(self, client):
+        for number in range(1, 4):
+            client.post("/ksbs", json={"ksb_name": f"K{number}", "description": f"Knowledge {number}"})
+
+        response = client.get("/ksbs/options?q=k&limit=2")
+
+        assert [o["name"] for o in response.json] == ["K1", "K2"]
+
+    def test_get_ksb_options_limit_is_at_least_one(self, client):
+        for number in range(1, 4):
+            client.post("/ksbs", json={"ksb_name": f"K{number}", "description": f"Knowledge {number}"})
+
+        response = client.get("/ksbs/options?limit=-1")
+
+        assert [o["name"] for o in response.json] == ["K1"]
+
+    def test_get_coin_options_escapes_wildcards(self, client):
+        client.post("/coins", json={"coin_name": "100% coin"})
+        client.post("/coins", json={"coin_name": "1000 coin"})
+
+        response = client.get("/coins/options?q=100%")
+
+        assert [o["name"] for o in response.json] == ["100% coin"]
+
+class TestCatalogueVersion:
+    def test_version_starts_at_zero(self, client):
+        response = client.get("/version")
+
+        assert response.status_code == 200
+        assert response.json == {"version": 0}
+
+    def test_version_changes_on_writes(self, client):
+        coin_id = client.post("/coins", json={"coin_name": "A coin"}).json["id"]
+        created = client.get("/version").json["version"]
+
+        client.get(f"/coins/{coin_id}")
+        assert client.get("/version").json["version"] == created
+
+        client.put(f"/coins/{coin_id}", json={"coin_name": "A new coin"})
+        updated = client.get("/version").json["version"]
+        assert updated > created
+
+        client.delete(f"/coins/{coin_id}")
+        assert client.get("/version").json["version"] > updated
+
+class TestChangeFeed:
+    def test_changes_are_empty(self, client):
+        response = client.get("/changes")
+
+        assert response.status_code == 200
+        assert response.json == {"changes": [], "last_seq": 0}
+
+    def test_changes_record_inserts_including_associations(self, client):
+        ksb = client.post("/ksbs", json={"ksb_name": "K1", "description": "A description"}).json
+        duty = client.post("/duties", json={"duty_name": "A duty", "description": "A description", "ksbs": ["K1"]}).json
+        coin = client.post("/coins", json={"coin_name": "A coin", "duties": ["A duty"]}).json
+
+        response = client.get("/changes?since=0")
+
+        assert [(c["entity"], c["op"], c["id"]) for c in response.json["changes"]] == [
+            ("ksb", "insert", ksb["id"]),
+            ("duty", "insert", duty["id"]),
+            ("duty_ksb", "insert", f"{duty['id']}:{ksb['id']}"),
+            ("coin", "insert", coin["id"]),
+            ("coin_duty", "insert", f"{coin['id']}:{duty['id']}"),
+        ]
+        assert [c["seq"] for c in response.json["changes"]] == [1, 2, 3, 4, 5]
+        assert response.json["changes"][3]["data"] == {"id": coin["id"], "coin_name": "A coin"}
+        assert response.json["last_seq"] == 5
+
+    def test_changes_since_returns_only_newer_changes(self, client):
+        client.post("/duties", json={"duty_name": "A duty", "description": "A description"})
+        client.post("/duties", json={"duty_name": "Another duty", "description": "Another description"})
+        coin = client.post("/coins", json={"coin_name": "A coin", "duties": ["A duty"]}).json
+        since = client.get("/version").json["version"]
+
+        client.put(f"/coins/{coin['id']}", json={"coin_name": "A new coin", "duties": ["Another duty"]})
+        client.delete(f"/coins/{coin['id']}")
+
+        response = client.get(f"/changes?since={since}")
+
+        changes = [(c["entity"], c["op"], c["data"]) for c in response.json["changes"]]
+        assert ("coin", "update", {"id": coin["id"], "coin_name": "A new coin"}) in changes
+        assert sorted(c[:2] for c in changes if c[0] == "coin_duty") == [("coin_duty", "delete"), ("coin_duty", "insert")]
+        assert changes[-1] == ("coin", "delete", None)
+
+    def test_changes_limit(self, client):
+        for number in range(3):
+            client.post("/ksbs", json={"ksb_name": f"K{number}", "description": f"Knowledge {number}"})
+
+        response = client.get("/changes?since=1&limit=1")
+
+        assert [c["seq"] for c in response.json["changes"]] == [2]
+        assert response.json["last_seq"] == 3
+
+class TestAssociationUpdates:
+    def create_duties(self, client, count):
+        with app.app_context():
+            db.session.add_all([Duty(duty_name=f"Duty {n:03}", description=f"Description {n:03}") for n in range(count)])
+            db.session.commit()
+
+    def duty_names(self, response):
+        return sorted(d["duty_name"] for d in response.json["duties"])
+
+    def test_patch_coin_adds_and_removes_duties(self, client):
+        self.create_duties(client, 3)
+        coin_id = client.post("/coins", json={"coin_name": "A coin", "duties": ["Duty 000", "Duty 001"]}).json["id"]
+
+        response = client.patch(f"/coins/{coin_id}", json={"duties": {"add": ["Duty 002", "Duty 001"], "remove": ["Duty 000"]}})
+
+        assert response.status_code == 200
+        assert self.duty_names(response) == ["Duty 001", "Duty 002"]
+
+    def test_patch_duty_adds_and_removes_ksbs(self, client):
+        client.post("/ksbs", json={"ksb_name": "K1", "description": "Knowledge"})
+        client.post("/ksbs", json={"ksb_name": "S1", "description": "Skill"})
+        duty_id = client.post("/duties", json={"duty_name": "A duty", "description": "A description", "ksbs": ["K1"]}).json["id"]
+
+        response = client.patch(f"/duties/{duty_id}", json={"ksbs": {"add": "s1", "remove": ["K1"]}})
+
+        assert response.status_code == 200
+        assert [k["ksb_name"] for k in response.json["ksbs"]] == ["S1"]
+
+    def test_update_with_missing_duty_changes_nothing(self, client):
+        self.create_duties(client, 2)
+        coin_id = client.post("/coins", json={"coin_name": "A coin", "duties": ["Duty 000"]}).json["id"]
+
+        response = client.put(f"/coins/{coin_id}", json={"coin_name": "A new coin", "duties": ["Duty 001", "Missing duty"]})
+        assert response.status_code == 404
+
+        response = client.get(f"/coins/{coin_id}")
+        assert response.json["coin_name"] == "A coin"
+        assert self.duty_names(response) == ["Duty 000"]
+
+    def test_update_records_only_changed_associations(self, client):
+        self.create_duties(client, 3)
+        coin_id = client.post("/coins", json={"coin_name": "A coin", "duties": ["Duty 000", "Duty 001"]}).json["id"]
+        since = client.get("/version").json["version"]
+
+        client.put(f"/coins/{coin_id}", json={"duties": ["Duty 001", "Duty 002"]})
+
+        changes = client.get(f"/changes?since={since}").json["changes"]
+        assert sorted((c["op"], c["id"].split(":")[0]) for c in changes) == [("delete", coin_id), ("insert", coin_id)]
+
+    def test_update_coin_with_hundreds_of_duties_issues_few_statements(self, client):
+        self.create_duties(client, 300)
+        names = [f"Duty {n:03}" for n in range(300)]
+        coin_id = client.post("/coins", json={"coin_name": "A coin", "duties": names[:299]}).json["id"]
+
+        statements = []
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            if "coin_duties" in statement and not statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            response = client.put(f"/coins/{coin_id}", json={"duties": names[1:]})
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert response.status_code == 200
+        assert len(response.json["duties"]) == 299
+        assert len(statements) == 2
+
+
+def expand(document):
+    def resolve(item):
+        item = dict(item)
+        for key in ("duties", "ksbs"):
+            if key in item:
+                item[key] = [resolve(document[key][ref]) for ref in item[key]]
+        return item
+    return [resolve(item) for item in document["items"]]
+
+class TestCompactFormat:
+    @pytest.fixture()
+    def catalogue(self, client):
+        client.post("/ksbs", json={"ksb_name": "K1", "description": "Knowledge 1"})
+        client.post("/duties", json={"duty_name": "Duty 1", "description": "Description 1", "ksbs": ["K1"]})
+        for number in range(3):
+            client.post("/coins", json={"coin_name": f"Coin {number}", "duties": ["Duty 1"]})
+        return client
+
+    def test_get_coins_defaults_to_nested_json(self, catalogue):
+        response = catalogue.get("/coins", headers={"Accept": "*/*"})
+
+        assert response.mimetype == "application/json"
+        assert response.json[0]["duties"][0]["ksbs"][0]["ksb_name"] == "K1"
+        assert "Accept" in response.vary
+
+    def test_get_coins_compact_sends_each_duty_once(self, catalogue):
+        response = catalogue.get("/coins", headers={"Accept": COMPACT_JSON})
+        document = json.loads(response.data)
+
+        assert response.mimetype == COMPACT_JSON
+        assert len(document["duties"]) == 1
+        assert len(document["ksbs"]) == 1
+        assert [coin["duties"] for coin in document["items"]] == [list(document["duties"])] * 3
+        assert expand(document) == catalogue.get("/coins").json
+
+    def test_get_duties_compact_paginated(self, catalogue):
+        response = catalogue.get("/duties?page=1&per_page=1", headers={"Accept": COMPACT_JSON})
+
+        assert response.headers["X-Total-Count"] == "1"
+        assert expand(json.loads(response.data)) == catalogue.get("/duties").json
+
+    def test_get_coins_compact_from_coin_documents(self, catalogue):
+        rebuild_coin_documents(db.session.connection())
+        db.session.commit()
+        app.config["COIN_DOCUMENTS"] = True
+        try:
+            response = catalogue.get("/coins", headers={"Accept": COMPACT_JSON})
+        finally:
+            app.config["COIN_DOCUMENTS"] = False
+
+        assert len(json.loads(response.data)["items"]) == 3
+
+    def test_get_coins_msgpack(self, catalogue):
+        msgpack = pytest.importorskip("msgpack")
+        response = catalogue.get("/coins", headers={"Accept": MSGPACK})
+
+        assert response.mimetype == MSGPACK
+        assert expand(msgpack.unpackb(response.data)) == catalogue.get("/coins").json
+
+    def test_large_responses_are_gzipped(self, catalogue):
+        response = catalogue.get("/coins", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.data)) == catalogue.get("/coins").json
+
+    def test_small_responses_are_not_compressed(self, client):
+        response = client.get("/version", headers={"Accept-Encoding": "gzip"})
+
+        assert "Content-Encoding" not in response.headers
+        assert "Accept-Encoding" in response.vary
+
+class TestStandards:
+    def test_names_are_unique_per_standard(self, client):
+        first = client.post("/coins", json={"coin_name": "Shared name"})
+        second = client.post("/coins", json={"coin_name": "Shared name"}, headers={"X-Standard": "data-engineer"})
+        duplicate = client.post("/coins?standard=data-engineer", json={"coin_name": "Shared name"})
+
+        assert first.status_code == 201
+        assert second.status_code == 201
+        assert duplicate.status_code == 400
+
+    def test_lists_only_show_the_requested_standard(self, client):
+        client.post("/ksbs", json={"ksb_name": "K1", "description": "Knowledge 1"})
+        client.post("/ksbs", json={"ksb_name": "K1", "description": "Knowledge 1"}, headers={"X-Standard": "data-engineer"})
+        client.post("/ksbs", json={"ksb_name": "K2", "description": "Knowledge 2"}, headers={"X-Standard": "data-engineer"})
+
+        assert [k["ksb_name"] for k in client.get("/ksbs").json] == ["K1"]
+        assert client.get("/ksbs?standard=data-engineer&page=1").headers["X-Total-Count"] == "2"
+        assert [o["name"] for o in client.get("/ksbs/options?q=k&standard=data-engineer").json] == ["K1", "K2"]
+
+    def test_duties_of_another_standard_cannot_be_linked(self, client):
+        client.post("/duties", json={"duty_name": "Duty 1", "description": "Description 1"}, headers={"X-Standard": "data-engineer"})
+
+        response = client.post("/coins", json={"coin_name": "Coin 1", "duties": ["Duty 1"]})
+
+        assert response.status_code == 404
+
+    def test_search_and_changes_are_scoped(self, client):
+        client.post("/coins", json={"coin_name": "Infrastructure coin"}, headers={"X-Standard": "data-engineer"})
+
+        assert client.get("/search?q=infra").json == []
+        assert client.get("/changes").json["changes"] == []
+        assert len(client.get("/search?q=infra&standard=data-engineer").json) == 1
+        assert len(client.get("/changes?standard=data-engineer").json["changes"]) == 1
+
+    def test_invalid_standard_is_rejected(self, client):
+        response = client.get("/coins", headers={"X-Standard": "Not a standard!"})
+
+        assert response.status_code == 400
+        assert response.json == {"error": "Invalid standard"}
+
+    def test_standard_on_its_own_database(self, client, tmp_path):
+        router = app.extensions["standards"]
+        router.configure({"data-engineer": f"sqlite:///{tmp_path / 'data-engineer.db'}"})
+        try:
+            router.create_all(db.metadata)
+            response = client.post("/coins", json={"coin_name": "Coin 1"}, headers={"X-Standard": "data-engineer"})
+            with router.engine("data-engineer").connect() as connection:
+                stored = connection.execute(db.select(Coin.coin_name, Coin.standard)).all()
+
+            assert response.status_code == 201
+            assert stored == [("Coin 1", "data-engineer")]
+            assert client.get("/coins", headers={"X-Standard": "data-engineer"}).json[0]["coin_name"] == "Coin 1"
+            assert Coin.query.count() == 0
+        finally:
+            router.configure({})
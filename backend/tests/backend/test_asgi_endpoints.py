@@ -0,0 +1,259 @@
+import pytest
+import os
+
+import asyncio
+import json
+import uuid
+
+os.environ["DB_URL"] = "sqlite:///:memory:"
+
+pytest.importorskip("aiosqlite")
+
+from app import db
+from asgi import async_database_url, create_app
+
+class ASGITestClient:
+    def __init__(self, application):
+        self.application = application
+        self.loop = asyncio.new_event_loop()
+
+    def request(self, method, path, json_body=None, headers=None):
+        path, _, query = path.partition("?")
+        body = json.dumps(json_body).encode() if json_body is not None else b""
+        scope = {
+            "type": "http", "method": method, "path": path, "query_string": query.encode(),
+            "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        self.loop.run_until_complete(self.application(scope, receive, send))
+        start, response_body = messages
+        headers = {name.decode(): value.decode() for name, value in start["headers"]}
+        payload = response_body["body"]
+        if headers["content-type"] == "application/json":
+            payload = json.loads(payload)
+        else:
+            payload = payload.decode()
+        return start["status"], payload, headers
+
+    def get(self, path, headers=None):
+        return self.request("GET", path, headers=headers)
+
+    def post(self, path, json, headers=None):
+        return self.request("POST", path, json, headers)
+
+    def put(self, path, json):
+        return self.request("PUT", path, json)
+
+    def patch(self, path, json):
+        return self.request("PATCH", path, json)
+
+    def delete(self, path):
+        return self.request("DELETE", path)
+
+    def close(self):
+        self.loop.run_until_complete(self.application.engine.dispose())
+        self.loop.close()
+
+@pytest.fixture()
+def async_client(tmp_path):
+    application = create_app(f"sqlite:///{tmp_path / 'asgi.db'}")
+    client = ASGITestClient(application)
+
+    async def create_tables():
+        async with application.engine.begin() as connection:
+            await connection.run_sync(db.metadata.create_all)
+
+    client.loop.run_until_complete(create_tables())
+    yield client
+    client.close()
+
+def test_async_database_url_uses_async_drivers():
+    assert async_database_url("sqlite:///db.sqlite").drivername == "sqlite+aiosqlite"
+    assert async_database_url("postgresql://user@host/db").drivername == "postgresql+asyncpg"
+    assert async_database_url("postgresql+psycopg2://user@host/db").drivername == "postgresql+asyncpg"
+
+def test_coin_table_is_empty(async_client):
+    status, body, _ = async_client.get("/coins")
+
+    assert status == 200
+    assert body == []
+
+def test_create_and_get_coin_with_duties(async_client):
+    async_client.post("/ksbs", {"ksb_name": "K1", "description": "A description"})
+    async_client.post("/duties", {"duty_name": "A duty", "description": "A description", "ksbs": "k1"})
+
+    status, coin, _ = async_client.post("/coins", {"coin_name": "A coin", "duties": ["A duty"]})
+    assert status == 201
+    assert coin["duties"][0]["duty_name"] == "A duty"
+    assert coin["duties"][0]["ksbs"][0]["ksb_name"] == "K1"
+
+    status, body, _ = async_client.get(f"/coins/{coin['id']}")
+    assert status == 200
+    assert body == coin
+
+def test_create_duplicate_coin_fails(async_client):
+    async_client.post("/coins", {"coin_name": "A coin"})
+    status, body, _ = async_client.post("/coins", {"coin_name": "A coin"})
+
+    assert status == 400
+    assert body == {"error": "Coin already exists"}
+
+def test_cannot_create_coin_with_non_existent_duty(async_client):
+    status, body, _ = async_client.post("/coins", {"coin_name": "A coin", "duties": ["A duty"]})
+
+    assert status == 404
+    assert body == {"error": "Duty does not exist"}
+
+def test_update_coin_with_new_duties(async_client):
+    for name in ["A duty", "Another duty", "More duty"]:
+        async_client.post("/duties", {"duty_name": name, "description": f"{name} description"})
+    _, coin, _ = async_client.post("/coins", {"coin_name": "A coin", "duties": ["A duty", "Another duty"]})
+
+    status, body, _ = async_client.put(f"/coins/{coin['id']}", {"coin_name": "A new coin", "duties": ["Another duty", "More duty"]})
+
+    assert status == 200
+    assert body["coin_name"] == "A new coin"
+    assert sorted(d["duty_name"] for d in body["duties"]) == ["Another duty", "More duty"]
+
+def test_update_duty_and_ksb(async_client):
+    _, ksb, _ = async_client.post("/ksbs", {"ksb_name": "K1", "description": "A description"})
+    _, duty, _ = async_client.post("/duties", {"duty_name": "A duty", "description": "A description"})
+
+    status, body, _ = async_client.put(f"/duties/{duty['id']}", {"duty_name": "A new duty", "ksbs": ["K1"]})
+    assert status == 200
+    assert body["duty_name"] == "A new duty"
+    assert body["ksbs"][0]["id"] == ksb["id"]
+
+    status, body, _ = async_client.put(f"/ksbs/{ksb['id']}", {"ksb_name": "S1"})
+    assert status == 200
+    assert body["ksb_name"] == "S1"
+
+def test_delete_entities(async_client):
+    async_client.post("/ksbs", {"ksb_name": "K1", "description": "A description"})
+    _, duty, _ = async_client.post("/duties", {"duty_name": "A duty", "description": "A description", "ksbs": ["K1"]})
+    _, coin, _ = async_client.post("/coins", {"coin_name": "A coin", "duties": ["A duty"]})
+    _, ksbs, _ = async_client.get("/ksbs")
+
+    assert async_client.delete(f"/ksbs/{ksbs[0]['id']}")[:2] == (200, "KSB successfully deleted")
+    assert async_client.delete(f"/duties/{duty['id']}")[:2] == (200, "Duty successfully deleted")
+    assert async_client.delete(f"/coins/{coin['id']}")[:2] == (200, "Coin successfully deleted")
+    assert async_client.get(f"/coins/{coin['id']}")[0] == 404
+
+def test_get_non_existent_items_fail(async_client):
+    random_id = str(uuid.uuid4())
+
+    assert async_client.get(f"/coins/{random_id}")[0] == 404
+    assert async_client.put(f"/duties/{random_id}", {})[0] == 404
+    assert async_client.delete(f"/ksbs/{random_id}")[0] == 404
+    assert async_client.get("/unknown")[0] == 404
+    assert async_client.request("PATCH", "/coins")[0] == 405
+
+def test_get_duties_paginated(async_client):
+    async_client.post("/duties", {"duty_name": "B duty", "description": "B description"})
+    async_client.post("/duties", {"duty_name": "A duty", "description": "A description"})
+
+    status, body, headers = async_client.get("/duties?page=2&per_page=1")
+
+    assert status == 200
+    assert headers["x-total-count"] == "2"
+    assert [d["duty_name"] for d in body] == ["B duty"]
+
+def test_version_changes_on_writes(async_client):
+    _, before, _ = async_client.get("/version")
+    async_client.post("/coins", {"coin_name": "A coin"})
+    _, after, _ = async_client.get("/version")
+
+    assert after["version"] > before["version"]
+
+def test_standards_are_kept_apart(async_client):
+    async_client.post("/coins", {"coin_name": "Shared name"}, headers={"X-Standard": "data-engineer"})
+    status, body, _ = async_client.post("/coins", {"coin_name": "Shared name"})
+
+    assert status == 201
+    assert [c["coin_name"] for c in async_client.get("/coins?page=1", headers={"X-Standard": "data-engineer"})[1]] == ["Shared name"]
+    assert async_client.get("/coins?page=1")[2]["x-total-count"] == "1"
+    assert async_client.get("/coins", headers={"X-Standard": "not a standard"})[0] == 400
+
+def test_filter_duties_and_coins_by_ksb(async_client):
+    async_client.post("/ksbs", {"ksb_name": "S14", "description": "A skill"})
+    async_client.post("/ksbs", {"ksb_name": "K1", "description": "Some knowledge"})
+    async_client.post("/duties", {"duty_name": "A duty", "description": "A description", "ksbs": ["S14", "K1"]})
+    async_client.post("/duties", {"duty_name": "Another duty", "description": "Another description", "ksbs": ["K1"]})
+    async_client.post("/coins", {"coin_name": "A coin", "duties": ["A duty", "Another duty"]})
+    async_client.post("/coins", {"coin_name": "Another coin", "duties": ["Another duty"]})
+
+    status, duties, _ = async_client.get("/duties?ksb=s14")
+    assert status == 200
+    assert [d["duty_name"] for d in duties] == ["A duty"]
+
+    _, coins, headers = async_client.get("/coins?ksb=S14&page=1")
+    assert [c["coin_name"] for c in coins] == ["A coin"]
+    assert headers["x-total-count"] == "1"
+
+def test_get_options_by_prefix(async_client):
+    for name in ["Deploy", "Automate", "Audit"]:
+        async_client.post("/duties", {"duty_name": name, "description": f"{name} description"})
+    async_client.post("/coins", {"coin_name": "100% coin"})
+    async_client.post("/coins", {"coin_name": "1000 coin"})
+
+    status, options, _ = async_client.get("/duties/options?q=au&limit=1")
+    assert status == 200
+    assert [o["name"] for o in options] == ["Audit"]
+    assert [o["name"] for o in async_client.get("/coins/options?q=100%25")[1]] == ["100% coin"]
+    assert async_client.get("/ksbs/options")[:2] == (200, [])
+
+def test_search(async_client):
+    async_client.post("/coins", {"coin_name": "Infrastructure coin"})
+    async_client.post("/duties", {"duty_name": "Provision infrastructure", "description": "A description"})
+
+    status, results, _ = async_client.get("/search?q=infra&type=coin")
+
+    assert status == 200
+    assert [r["name"] for r in results] == ["Infrastructure coin"]
+    assert len(async_client.get("/search?q=infra")[1]) == 2
+    assert async_client.get("/search?q=infra", headers={"X-Standard": "devops"})[1] == []
+
+def test_patch_coin_and_duty_associations(async_client):
+    for name in ["K1", "S1"]:
+        async_client.post("/ksbs", {"ksb_name": name, "description": f"{name} description"})
+    for name in ["A duty", "Another duty"]:
+        async_client.post("/duties", {"duty_name": name, "description": f"{name} description", "ksbs": ["K1"]})
+    _, coin, _ = async_client.post("/coins", {"coin_name": "A coin", "duties": ["A duty"]})
+    _, duty, _ = async_client.get("/duties?page=1")
+
+    status, body, _ = async_client.patch(f"/coins/{coin['id']}", {"duties": {"add": ["Another duty"], "remove": ["A duty"]}})
+    assert status == 200
+    assert [d["duty_name"] for d in body["duties"]] == ["Another duty"]
+    assert body["coin_name"] == "A coin"
+
+    status, body, _ = async_client.patch(f"/duties/{duty[0]['id']}", {"ksbs": {"add": "s1", "remove": ["K1"]}})
+    assert status == 200
+    assert [k["ksb_name"] for k in body["ksbs"]] == ["S1"]
+
+    assert async_client.patch(f"/coins/{coin['id']}", {"duties": {"add": ["No duty"]}})[0] == 404
+
+def test_unsupported_query_parameters_are_rejected(async_client):
+    status, body, _ = async_client.get("/duties?sort=name")
+
+    assert status == 400
+    assert body == {"error": "Unsupported query parameter: sort"}
+    assert async_client.get("/coins?standard=default")[0] == 200
+
+def test_changes_feed(async_client):
+    _, before, _ = async_client.get("/version")
+    async_client.post("/coins", {"coin_name": "A coin"})
+    async_client.post("/coins", {"coin_name": "Another coin"}, headers={"X-Standard": "devops"})
+
+    status, body, _ = async_client.get(f"/changes?since={before['version']}")
+
+    assert status == 200
+    assert [(c["entity"], c["op"], c["data"]["coin_name"]) for c in body["changes"]] == [("coin", "insert", "A coin")]
+    assert body["last_seq"] == async_client.get("/version")[1]["version"]
+    assert len(async_client.get(f"/changes?since={before['version']}&limit=1", headers={"X-Standard": "devops"})[1]["changes"]) == 1
@@ -0,0 +1,122 @@
+import pytest
+import os
+
+import json
+
+os.environ["DB_URL"] = "sqlite:///:memory:"
+
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db, changes, duty_ksb
+from catalogue import export_catalogue, import_catalogue
+
+@pytest.fixture()
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as test_client:
+        with app.app_context():
+            db.create_all()
+
+            yield test_client
+
+            db.drop_all()
+
+@pytest.fixture()
+def catalogue(client):
+    client.post("/ksbs", json={"ksb_name": "K1", "description": "Knowledge 1"})
+    client.post("/ksbs", json={"ksb_name": "Communication", "description": "Behaviour 1"})
+    client.post("/duties", json={"duty_name": "Duty 1", "description": "Description 1", "ksbs": ["K1", "Communication"]})
+    client.post("/duties", json={"duty_name": "Duty 2", "description": "Description 2", "ksbs": ["K1"]})
+    client.post("/coins", json={"coin_name": "Coin 1", "duties": ["Duty 1", "Duty 2"]})
+    client.post("/coins", json={"coin_name": "Coin 2", "duties": ["Duty 2"]})
+    return client
+
+def sorted_coins(client):
+    coins = sorted(client.get("/coins").json, key=lambda coin: coin["coin_name"])
+    for coin in coins:
+        coin["duties"].sort(key=lambda duty: duty["duty_name"])
+        for duty in coin["duties"]:
+            duty["ksbs"].sort(key=lambda ksb: ksb["ksb_name"])
+    return coins
+
+def reset_database():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+@pytest.mark.parametrize("file_format, name", [("jsonl", "catalogue.jsonl"), ("csv", "catalogue")])
+def test_export_and_import_round_trip(catalogue, tmp_path, file_format, name):
+    path = str(tmp_path / name)
+    expected = sorted_coins(catalogue)
+
+    with db.engine.connect() as connection:
+        counts = export_catalogue(connection, db.metadata, path, file_format, chunk_size=2)
+    reset_database()
+    import_catalogue(db.engine, db.metadata, path, file_format, chunk_size=2)
+
+    assert counts == {"ksbs": 2, "duties": 2, "coins": 2, "coin_duties": 3, "duty_ksb": 3}
+    assert sorted_coins(catalogue) == expected
+    assert len(catalogue.get("/duties?ksb=K1").json) == 2
+
+def test_jsonl_export_writes_referenced_rows_first(catalogue, tmp_path):
+    path = tmp_path / "catalogue.jsonl"
+    with db.engine.connect() as connection:
+        export_catalogue(connection, db.metadata, str(path))
+
+    types = [json.loads(line)["type"] for line in path.read_text().splitlines()]
+
+    assert types == ["ksb"] * 2 + ["duty"] * 2 + ["coin"] * 2 + ["coin_duty"] * 3 + ["duty_ksb"] * 3
+
+def test_import_is_idempotent(catalogue, tmp_path):
+    path = str(tmp_path / "catalogue.jsonl")
+    expected = sorted_coins(catalogue)
+    with db.engine.connect() as connection:
+        export_catalogue(connection, db.metadata, path)
+
+    counts = import_catalogue(db.engine, db.metadata, path)
+
+    assert sorted_coins(catalogue) == expected
+    assert counts == {"ksbs": 0, "duties": 0, "coins": 0, "coin_duties": 0, "duty_ksb": 0}
+
+def test_import_fails_on_a_name_clash_with_another_row(catalogue, tmp_path):
+    path = tmp_path / "catalogue.jsonl"
+    path.write_text("\n".join(json.dumps(record) for record in [
+        {"type": "ksb", "id": "new-ksb", "ksb_name": "K1", "description": "Another description", "standard": "default"},
+        {"type": "duty_ksb", "duty_id": catalogue.get("/duties").json[0]["id"], "ksb_id": "new-ksb"},
+    ]))
+
+    with pytest.raises(IntegrityError):
+        import_catalogue(db.engine, db.metadata, str(path))
+    result = app.test_cli_runner().invoke(args=["catalogue", "import", str(path)])
+
+    assert result.exit_code == 1
+    assert "run the import again" in result.output
+    assert db.session.execute(db.select(duty_ksb).where(duty_ksb.c.ksb_id == "new-ksb")).first() is None
+
+def test_import_resumes_from_checkpoint(catalogue, tmp_path):
+    path = str(tmp_path / "catalogue.jsonl")
+    checkpoint = str(tmp_path / "catalogue.checkpoint")
+    with db.engine.connect() as connection:
+        export_catalogue(connection, db.metadata, path)
+    reset_database()
+    (tmp_path / "catalogue.checkpoint").write_text(json.dumps({"jsonl": 6}))
+
+    counts = import_catalogue(db.engine, db.metadata, path, chunk_size=2, checkpoint=checkpoint)
+
+    assert counts == {"ksbs": 0, "duties": 0, "coins": 0, "coin_duties": 3, "duty_ksb": 3}
+    assert json.loads((tmp_path / "catalogue.checkpoint").read_text()) == {"jsonl": 12}
+
+def test_import_command_asks_replicas_to_reload(catalogue, tmp_path):
+    path = str(tmp_path / "catalogue.jsonl")
+    runner = app.test_cli_runner()
+    runner.invoke(args=["catalogue", "export", path])
+    reset_database()
+
+    result = runner.invoke(args=["catalogue", "import", path])
+    last_change = db.session.execute(db.select(changes).order_by(changes.c.seq.desc())).first()
+
+    assert result.exit_code == 0
+    assert "coin_duties: 3 rows" in result.output
+    assert not os.path.exists(f"{path}.checkpoint")
+    assert (last_change.entity, last_change.op) == ("catalogue", "reload")
+    assert catalogue.get("/version").json["version"] == last_change.seq
@@ -0,0 +1,107 @@
+import pytest
+import os
+
+import json
+
+os.environ["DB_URL"] = "sqlite:///:memory:"
+
+from app import app, db, Coin, coin_documents, rebuild_coin_documents
+
+@pytest.fixture()
+def client():
+    app.config["TESTING"] = True
+    app.config["COIN_DOCUMENTS"] = True
+    with app.test_client() as test_client:
+        with app.app_context():
+            db.create_all()
+
+            yield test_client
+
+            db.drop_all()
+    app.config["COIN_DOCUMENTS"] = False
+
+def normalise(coin):
+    duties = sorted(
+        (dict(d, ksbs=sorted(d["ksbs"], key=lambda k: k["id"])) for d in coin["duties"]),
+        key=lambda d: d["id"]
+    )
+    return dict(coin, duties=duties)
+
+def assert_documents_match_tables(client):
+    with app.app_context():
+        expected = {c.id: normalise(c.to_dict()) for c in Coin.query.all()}
+        stored = db.session.execute(db.select(coin_documents)).all()
+    assert {row.coin_id: normalise(json.loads(row.document)) for row in stored} == expected
+
+    response = client.get("/coins")
+    assert {c["id"]: normalise(c) for c in response.json} == expected
+    for coin_id, coin in expected.items():
+        assert normalise(client.get(f"/coins/{coin_id}").json) == coin
+
+def create_catalogue(client):
+    for name in ["K1", "S1", "B1"]:
+        client.post("/ksbs", json={"ksb_name": name, "description": f"{name} description"})
+    duty = client.post("/duties", json={"duty_name": "A duty", "description": "A description", "ksbs": ["K1", "S1"]}).json
+    other_duty = client.post("/duties", json={"duty_name": "Another duty", "description": "Another description", "ksbs": ["B1"]}).json
+    coin = client.post("/coins", json={"coin_name": "A coin", "duties": ["A duty", "Another duty"]}).json
+    other_coin = client.post("/coins", json={"coin_name": "Another coin", "duties": ["Another duty"]}).json
+    return duty, other_duty, coin, other_coin
+
+def test_documents_are_created_with_coins(client):
+    create_catalogue(client)
+
+    assert_documents_match_tables(client)
+
+def test_documents_follow_coin_updates_and_deletes(client):
+    duty, other_duty, coin, other_coin = create_catalogue(client)
+
+    client.put(f"/coins/{coin['id']}", json={"coin_name": "A new coin", "duties": ["Another duty"]})
+    assert_documents_match_tables(client)
+
+    client.delete(f"/coins/{other_coin['id']}")
+    assert_documents_match_tables(client)
+    assert client.get(f"/coins/{other_coin['id']}").status_code == 404
+
+def test_documents_follow_duty_changes(client):
+    duty, other_duty, coin, other_coin = create_catalogue(client)
+
+    client.put(f"/duties/{other_duty['id']}", json={"duty_name": "Renamed duty", "ksbs": ["K1"]})
+    assert_documents_match_tables(client)
+
+    client.delete(f"/duties/{duty['id']}")
+    assert_documents_match_tables(client)
+
+def test_documents_follow_ksb_changes(client):
+    create_catalogue(client)
+    ksbs = {k["ksb_name"]: k["id"] for k in client.get("/ksbs").json}
+
+    client.put(f"/ksbs/{ksbs['B1']}", json={"ksb_name": "B2"})
+    assert_documents_match_tables(client)
+
+    client.delete(f"/ksbs/{ksbs['K1']}")
+    assert_documents_match_tables(client)
+
+def test_rebuild_documents_from_tables(client):
+    create_catalogue(client)
+    with app.app_context():
+        db.session.execute(coin_documents.delete())
+        rebuild_coin_documents(db.session.connection())
+        db.session.commit()
+
+    assert_documents_match_tables(client)
+
+def test_documents_follow_patched_associations(client):
+    duty, other_duty, coin, other_coin = create_catalogue(client)
+
+    client.patch(f"/coins/{other_coin['id']}", json={"duties": {"add": ["A duty"], "remove": ["Another duty"]}})
+    assert_documents_match_tables(client)
+
+    client.patch(f"/duties/{duty['id']}", json={"ksbs": {"add": ["B1"], "remove": ["K1"]}})
+    assert_documents_match_tables(client)
+
+def test_documents_stay_within_their_standard(client):
+    coin = client.post("/coins", json={"coin_name": "A coin"}, headers={"X-Standard": "tenant-a"}).json
+
+    assert client.get(f"/coins/{coin['id']}", headers={"X-Standard": "tenant-a"}).status_code == 200
+    assert client.get(f"/coins/{coin['id']}", headers={"X-Standard": "tenant-b"}).status_code == 404
+    assert client.get("/coins", headers={"X-Standard": "tenant-b"}).json == []
@@ -0,0 +1,78 @@
+import pytest
+import os
+
+os.environ["DB_URL"] = "sqlite:///:memory:"
+
+from app import app, db, Coin
+from replicas import STICKY_COOKIE
+
+@pytest.fixture()
+def replica(tmp_path):
+    read_replica = app.extensions["read_replica"]
+    read_replica.configure(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(read_replica.engine)
+    yield read_replica
+    read_replica.configure(None)
+
+@pytest.fixture()
+def client(replica):
+    app.config["TESTING"] = True
+    with app.test_client() as test_client:
+        with app.app_context():
+            db.create_all()
+
+            yield test_client
+
+            db.drop_all()
+
+def replica_coin_names(replica):
+    with replica.engine.connect() as connection:
+        return connection.execute(db.select(Coin.coin_name)).scalars().all()
+
+def add_replica_coin(replica, coin_name):
+    with replica.engine.begin() as connection:
+        connection.execute(db.insert(Coin), {"id": coin_name, "coin_name": coin_name, "standard": "default"})
+
+def test_reads_go_to_the_replica(client, replica):
+    add_replica_coin(replica, "Replicated coin")
+
+    response = client.get("/coins")
+
+    assert [c["coin_name"] for c in response.json] == ["Replicated coin"]
+    assert Coin.query.count() == 0
+
+def test_writes_go_to_the_primary(client, replica):
+    response = client.post("/coins", json={"coin_name": "New coin"})
+
+    assert response.status_code == 201
+    assert [c.coin_name for c in Coin.query.all()] == ["New coin"]
+    assert replica_coin_names(replica) == []
+
+def test_reads_after_a_write_stay_on_the_primary(client, replica):
+    add_replica_coin(replica, "Replicated coin")
+
+    response = client.post("/coins", json={"coin_name": "New coin"})
+
+    assert STICKY_COOKIE in response.headers["Set-Cookie"]
+    assert [c["coin_name"] for c in client.get("/coins").json] == ["New coin"]
+    assert client.get(f"/coins/{response.json['id']}").status_code == 200
+
+def test_reads_return_to_the_replica_once_the_window_has_passed(client, replica):
+    add_replica_coin(replica, "Replicated coin")
+    app.config["READ_YOUR_WRITES_SECONDS"] = 0
+    try:
+        client.post("/coins", json={"coin_name": "New coin"})
+        response = client.get("/coins")
+    finally:
+        app.config["READ_YOUR_WRITES_SECONDS"] = 5
+
+    assert [c["coin_name"] for c in response.json] == ["Replicated coin"]
+
+def test_failed_writes_do_not_stick_to_the_primary(client):
+    client.post("/coins", json={"coin_name": "New coin"})
+    client.delete_cookie(STICKY_COOKIE)
+
+    response = client.post("/coins", json={"coin_name": "New coin"})
+
+    assert response.status_code == 400
+    assert "Set-Cookie" not in response.headers
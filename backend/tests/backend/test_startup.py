@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import inspect
+
+os.environ["DB_URL"] = "sqlite:///:memory:"
+
+from app import app, db, KSB
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 1500))
+LAZY_MODULES = ("requests", "asgi", "sqlalchemy.ext.asyncio", "aiosqlite")
+
+def import_times(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        env={**os.environ, "DB_URL": "sqlite:///:memory:"}
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+@pytest.fixture(scope="module")
+def app_import_times():
+    return import_times("app")
+
+def test_app_import_stays_within_budget(app_import_times):
+    assert app_import_times["app"] < IMPORT_TIME_BUDGET_MS
+
+@pytest.mark.parametrize("module", LAZY_MODULES)
+def test_app_import_skips_lazy_modules(app_import_times, module):
+    assert module not in app_import_times
+
+def test_init_db_command_creates_the_schema():
+    runner = app.test_cli_runner()
+    with app.app_context():
+        try:
+            result = runner.invoke(args=["init-db"])
+            assert result.exit_code == 0
+            assert {"coins", "duties", "ksbs", "changes"} <= set(inspect(db.engine).get_table_names())
+        finally:
+            db.drop_all()
+
+def test_init_db_command_fills_in_missing_ksb_codes():
+    runner = app.test_cli_runner()
+    with app.app_context():
+        try:
+            db.create_all()
+            with db.engine.begin() as connection:
+                connection.execute(db.insert(KSB.__table__), [
+                    {"id": "1", "ksb_name": "s014", "description": "Skill", "standard": "default"},
+                    {"id": "2", "ksb_name": "Teamwork", "description": "Behaviour", "standard": "default"},
+                ])
+
+            result = runner.invoke(args=["init-db"])
+
+            assert "Filled in 1 missing KSB codes" in result.output
+            with db.engine.connect() as connection:
+                codes = dict(connection.execute(db.select(KSB.id, KSB.code)).all())
+            assert codes == {"1": "S14", "2": None}
+        finally:
+            db.drop_all()
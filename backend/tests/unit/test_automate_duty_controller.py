@@ -18,4 +18,71 @@ def test_create_duty_function_in_controller_calls_mark_complete_function_in_mode
 def test_create_duty_function_in_controller_calls_complete_status_function_in_model(duty_instance, mocker):
     mock_complete_status = mocker.patch('models.automate_duty.AutomateDuty.complete_status', return_value = "Duty is complete")
     duty_instance.create_duties("Number","Descripton","KSBs")
-    assert mock_complete_status.call_count == 1
\ No newline at end of file
+    assert mock_complete_status.call_count == 1
+
+def test_create_duties_batch_saves_all_duties_once(duty_instance, mocker):
+    mock_save_all = mocker.patch('models.automate_duty.AutomateDuty.save_all', return_value="2 duties saved")
+    mock_save = mocker.patch('models.automate_duty.AutomateDuty.save')
+    records = [
+        {"number": "1", "description": "Description", "ksbs": "K1"},
+        {"number": "2", "description": "Another description", "ksbs": "S1"}
+    ]
+    duties, errors = duty_instance.create_duties_batch(records)
+    assert errors == []
+    assert len(duties) == 2
+    assert mock_save_all.call_count == 1
+    assert mock_save.call_count == 0
+
+def test_create_duties_batch_marks_duties_complete(duty_instance):
+    duties, errors = duty_instance.create_duties_batch([{"number": "1", "description": "Description", "ksbs": "K1"}])
+    assert duties[0].complete == True
+
+def test_create_duties_batch_drops_duplicate_numbers(duty_instance):
+    records = [
+        {"number": "1", "description": "Description", "ksbs": "K1"},
+        {"number": " 1 ", "description": "Same number", "ksbs": "K2"},
+        {"number": "2", "description": "Existing number", "ksbs": "K3"}
+    ]
+    duties, errors = duty_instance.create_duties_batch(records, existing_numbers=["2"])
+    assert errors == []
+    assert [d.number for d in duties] == ["1"]
+    assert duties[0].description == "Description"
+
+def test_create_duties_batch_rejects_whole_batch_if_invalid(duty_instance, mocker):
+    mock_save_all = mocker.patch('models.automate_duty.AutomateDuty.save_all')
+    records = [
+        {"number": "1", "description": "Description", "ksbs": "K1"},
+        {"number": "2", "description": ""}
+    ]
+    duties, errors = duty_instance.create_duties_batch(records)
+    assert duties == []
+    assert errors == [{"index": 1, "error": "Missing description, ksbs"}]
+    assert mock_save_all.call_count == 0
+
+def test_create_duties_batch_joins_ksb_lists_and_keeps_numbers(duty_instance):
+    records = [{"number": 0, "description": "Description", "ksbs": ["K1", "K2"]}]
+    duties, errors = duty_instance.create_duties_batch(records)
+    assert errors == []
+    assert duties[0].number == "0"
+    assert duties[0].ksbs == "K1 K2"
+
+def test_create_duties_batch_rejects_values_that_are_not_text(duty_instance):
+    records = [
+        {"number": "1", "description": {"text": "Description"}, "ksbs": "K1"},
+        {"number": True, "description": "Description", "ksbs": [["K1"]]}
+    ]
+    duties, errors = duty_instance.create_duties_batch(records)
+    assert duties == []
+    assert errors == [{"index": 0, "error": "Invalid description"}, {"index": 1, "error": "Invalid number, ksbs"}]
+
+def test_parse_duty_records_from_csv(duty_instance):
+    content = "number,description,ksbs\n1,Description,K1 K2\n"
+    assert duty_instance.parse_duty_records(content, "csv") == [{"number": "1", "description": "Description", "ksbs": "K1 K2"}]
+
+def test_parse_duty_records_from_json(duty_instance):
+    content = '{"duties": [{"number": "1", "description": "Description", "ksbs": "K1"}]}'
+    assert duty_instance.parse_duty_records(content, "json") == [{"number": "1", "description": "Description", "ksbs": "K1"}]
+
+def test_parse_duty_records_rejects_unknown_format(duty_instance):
+    with pytest.raises(ValueError):
+        duty_instance.parse_duty_records("", "xml")
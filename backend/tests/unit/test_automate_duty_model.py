@@ -19,4 +19,20 @@ def test_duty_mark_complete_is_successful(duty_instance):
     assert duty_instance.complete == True
 
 def test_duty_complete_status_message_is_correct(duty_instance):
-    assert duty_instance.complete_status() == "Duty is complete"
\ No newline at end of file
+    assert duty_instance.complete_status() == "Duty is complete"
+
+def test_save_all_function_is_done_correctly(duty_instance):
+    assert AutomateDuty.save_all([duty_instance, duty_instance.create_duty()]) == "2 duties saved"
+
+def test_duty_to_dict(duty_instance):
+    assert duty_instance.to_dict() == {
+        "id": duty_instance.id,
+        "number": "Duty Number",
+        "description": "Duty Description",
+        "ksbs": "Duty KSBs",
+        "complete": False
+    }
+
+def test_duty_ksb_codes_are_parsed():
+    duty = AutomateDuty("1", "Description", "K4 K5 S14")
+    assert [str(code) for code in duty.ksb_codes] == ["K4", "K5", "S14"]
@@ -0,0 +1,48 @@
+from models.ksb import KSBCode, KSBIndex, is_ksb_code_list, parse_ksbs, parse_ksb_code
+import pytest
+
+@pytest.fixture
+def ksb_index():
+    index = KSBIndex()
+    index.add("duty-1", parse_ksbs("K4 K5 S14"))
+    index.add("duty-2", parse_ksbs("S14 B2"))
+    return index
+
+def test_parse_ksbs_normalises_free_text():
+    assert parse_ksbs("K4 K5 K6\n\nS9 s14, b02") == [
+        KSBCode("K", 4), KSBCode("K", 5), KSBCode("K", 6),
+        KSBCode("S", 9), KSBCode("S", 14), KSBCode("B", 2)
+    ]
+
+def test_parse_ksbs_sorts_and_removes_duplicates():
+    assert [str(code) for code in parse_ksbs("B3 S1 K2 K 2")] == ["K2", "S1", "B3"]
+
+def test_parse_ksbs_ignores_text_without_codes():
+    assert parse_ksbs("Who's reading this?!") == []
+    assert parse_ksbs(None) == []
+
+def test_is_ksb_code_list_rejects_other_text():
+    assert is_ksb_code_list("K4, s14\n\nB2 / K5")
+    assert not is_ksb_code_list("Knowledge four")
+    assert not is_ksb_code_list("K4 and teamwork")
+    assert not is_ksb_code_list("")
+
+def test_parse_ksb_code_only_matches_a_single_code():
+    assert parse_ksb_code(" k07 ") == KSBCode("K", 7)
+    assert parse_ksb_code("K1 K2") is None
+    assert parse_ksb_code("Knowledge") is None
+
+def test_ksb_index_lookup(ksb_index):
+    assert ksb_index.lookup("S14") == {"duty-1", "duty-2"}
+    assert ksb_index.lookup(KSBCode("B", 2)) == {"duty-2"}
+    assert ksb_index.lookup("K99") == set()
+
+def test_ksb_index_add_replaces_previous_codes(ksb_index):
+    ksb_index.add("duty-1", parse_ksbs("B2"))
+    assert ksb_index.lookup("K4") == set()
+    assert ksb_index.lookup("B2") == {"duty-1", "duty-2"}
+
+def test_ksb_index_remove(ksb_index):
+    ksb_index.remove("duty-2")
+    assert ksb_index.lookup("S14") == {"duty-1"}
+    assert ksb_index.lookup("B2") == set()
@@ -1,10 +1,18 @@
-from flask import Flask, render_template, request, redirect, session, abort
+from flask import Flask, Response, render_template, request, redirect, session, abort, jsonify, url_for
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from collections import deque
 from datetime import datetime
-import requests
+from auth import RateLimiter, ServerSideSessionInterface, UserCache, create_session_store, needs_rehash
+from catalogue import CatalogueReplica
+import codec
+from events import Broadcaster, Poller, change_message
+from fragment_cache import FragmentCacheExtension
+from jobs import JobQueue
+from jinja2 import FileSystemBytecodeCache
+import json
+import time
 import os
 from dotenv import load_dotenv
 
@@ -13,6 +21,17 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "secret")
 
+# Compiled templates are kept on disk so new worker processes skip parsing them
+jinja_cache_dir = os.getenv("JINJA_CACHE_DIR", os.path.join(app.instance_path, "jinja"))
+os.makedirs(jinja_cache_dir, exist_ok=True)
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(jinja_cache_dir)}
+app.jinja_env.add_extension(FragmentCacheExtension)
+
+if os.getenv("SESSION_STORE"):
+    app.session_interface = ServerSideSessionInterface(create_session_store(os.getenv("SESSION_STORE")))
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///db.sqlite"
 db = SQLAlchemy(app)
 
@@ -22,12 +41,54 @@ class User(db.Model):
     password = db.Column(db.String, nullable=False)
     role = db.Column(db.String, nullable=False)
 
-with app.app_context():
+@app.cli.command('init-db')
+def init_db():
     db.create_all()
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:5000")
+ADMIN_PAGE_SIZE = 50
+backend_session = None
+
+def backend_request(method, path, **kwargs):
+    global backend_session
+    if backend_session is None:
+        # requests is imported on first use so it stays out of the startup path
+        import requests
+        backend_session = requests.Session()
+    # The shared session keeps the backend's cookies, so reads after a write go to its primary database
+    return backend_session.request(method, f'{BACKEND_URL}/{path}', **kwargs)
+
+catalogue = CatalogueReplica(backend_request)
+broadcaster = Broadcaster(max_subscribers=int(os.getenv("EVENTS_MAX_SUBSCRIBERS", 5000)))
+catalogue.listeners.append(lambda change: broadcaster.publish(change['seq'], change_message(change)))
+change_poller = Poller(catalogue.sync, float(os.getenv("EVENTS_POLL_INTERVAL", 1)))
 completions = set()
+completions_version = 0
 request_log = deque(maxlen=100)
+user_cache = UserCache(ttl=int(os.getenv("USER_CACHE_TTL", 60)))
+login_limiter = RateLimiter(rate=float(os.getenv("LOGIN_RATE", 0.2)), burst=int(os.getenv("LOGIN_BURST", 5)))
+JOB_WAIT = float(os.getenv("JOB_WAIT", 2))
+
+def load_user(username):
+    user = User.query.filter_by(username=username).first()
+    return (user.password, user.role) if user else None
+
+def send_job(method, path, payload):
+    response = backend_request(method.lower(), path, json=payload, timeout=float(os.getenv("JOB_TIMEOUT", 10)))
+    return response.status_code, response.text.strip()[:500]
+
+job_queue = JobQueue(
+    os.getenv("JOB_QUEUE", os.path.join(app.instance_path, "jobs.sqlite")),
+    send_job,
+    on_done=lambda job: catalogue.sync(),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+)
+
+def queue_write(method, path, payload=None):
+    # Short writes finish before the redirect; slower ones carry on in the background
+    job_id = job_queue.submit(method, path, payload)
+    job = job_queue.wait(job_id, JOB_WAIT)
+    return {} if job['status'] == 'done' else {'job': job_id}
 
 def login_required(f):
     @wraps(f)
@@ -37,6 +98,14 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated
 
+def get_page(path):
+    page = max(request.args.get('page', 1, type=int), 1)
+    response = backend_request('get', path, params={'page': page, 'per_page': ADMIN_PAGE_SIZE},
+                               headers={'Accept': codec.ACCEPT})
+    total = int(response.headers.get('X-Total-Count', 0))
+    pages = max((total + ADMIN_PAGE_SIZE - 1) // ADMIN_PAGE_SIZE, 1)
+    return codec.expand(codec.decode(response)), page, pages
+
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -45,6 +114,20 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated
 
+def render_timed(template, **context):
+    start = time.perf_counter()
+    response = app.make_response(render_template(template, **context))
+    response.headers['Server-Timing'] = f'render;dur={(time.perf_counter() - start) * 1000:.2f}'
+    return response
+
+@app.template_filter('timestamp')
+def format_timestamp(value):
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+@app.before_request
+def start_job_worker():
+    job_queue.start()
+
 @app.before_request
 def log_request():
     request_log.append({
@@ -58,13 +141,23 @@ def log_request():
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
+        if not login_limiter.allowed(request.remote_addr):
+            return render_template('login.html', error='Too many login attempts. Try again later.'), 429
+
         username = request.form['username']
         password = request.form['password']
-        user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        user = user_cache.get(username, load_user)
+        if user and check_password_hash(user[0], password):
+            if needs_rehash(user[0], PASSWORD_HASH_METHOD):
+                User.query.filter_by(username=username).update(
+                    {'password': generate_password_hash(password, method=PASSWORD_HASH_METHOD)}
+                )
+                db.session.commit()
+                user_cache.invalidate(username)
             session['username'] = username
-            session['role'] = user.role
+            session['role'] = user[1]
             return redirect('/')
+        login_limiter.hit(request.remote_addr)
         return render_template('login.html', error='Invalid username or password.')
     return render_template('login.html')
 
@@ -75,17 +168,25 @@ def logout():
 
 @app.route('/')
 def index():
-    coins = requests.get(f'{BACKEND_URL}/coins').json()
+    version = catalogue.sync()
 
-    for coin in coins:
-        coin['completed'] = coin['id'] in completions
+    # The coin list is only built and rendered when its fragment is not cached
+    def load_coins():
+        coins = catalogue.coin_list()
+        for coin in coins:
+            coin['completed'] = coin['id'] in completions
+        return coins
 
-    return render_template('index.html', coins=coins, username=session.get('username'), role=session.get('role'))
+    return render_timed('index.html', load_coins=load_coins, version=version,
+                        completions_version=completions_version,
+                        username=session.get('username'), role=session.get('role'))
 
 @app.post('/coins/<id>/toggle_completion')
 def toggle_coin_completion(id):
+    global completions_version
     if session.get('role') not in ('authenticated', 'admin'):
         return redirect('/login')
+    completions_version += 1
     if id in completions:
         completions.discard(id)
     else:
@@ -94,18 +195,36 @@ def toggle_coin_completion(id):
 
 @app.route('/duties/<string:duty_id>')
 def duty_detail(duty_id):
-    duty = requests.get(f'{BACKEND_URL}/duties/{duty_id}').json()
-    all_coins = requests.get(f'{BACKEND_URL}/coins').json()
-    associated_coins = [c for c in all_coins if any(d['id'] == duty_id for d in c['duties'])]
-    return render_template('duty_detail.html', duty=duty, associated_coins=associated_coins, username=session.get('username'), role=session.get('role'))
+    version = catalogue.sync()
+    if duty_id not in catalogue.duties:
+        abort(404)
+
+    def load_duty():
+        return catalogue.duty(duty_id), catalogue.coins_with_duty(duty_id)
+
+    return render_timed('duty_detail.html', load_duty=load_duty, duty_id=duty_id, version=version,
+                        username=session.get('username'), role=session.get('role'))
+
+@app.route('/events')
+def events():
+    change_poller.start()
+    broadcaster.seed(catalogue.sync())
+    last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int) or broadcaster.last_id
+
+    if not broadcaster.subscribe():
+        abort(503)
+    response = Response(broadcaster.stream(last_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(broadcaster.unsubscribe)
+    return response
 
 @app.route('/admin/coins')
 @login_required
 @admin_required
 def admin_coins():
-    coins = requests.get(f'{BACKEND_URL}/coins').json()
-    duties = requests.get(f'{BACKEND_URL}/duties').json()
-    return render_template('admin/coins.html', coins=coins, duties=duties,
+    coins, page, pages = get_page('coins')
+    job = job_queue.get(request.args.get('job', type=int))
+    return render_template('admin/coins.html', coins=coins, page=page, pages=pages, job=job,
                            username=session.get('username'), role=session.get('role'))
 
 @app.route('/admin/coins/create', methods=['POST'])
@@ -114,8 +233,8 @@ def admin_coins():
 def admin_create_coin():
     coin_name = request.form['coin_name']
     duties = request.form.getlist('duties')
-    requests.post(f'{BACKEND_URL}/coins', json={'coin_name': coin_name, 'duties': duties})
-    return redirect('/admin/coins')
+    redirect_args = queue_write('POST', 'coins', {'coin_name': coin_name, 'duties': duties})
+    return redirect(url_for('admin_coins', **redirect_args))
 
 @app.route('/admin/coins/<string:coin_id>/update', methods=['POST'])
 @login_required
@@ -123,23 +242,23 @@ def admin_create_coin():
 def admin_update_coin(coin_id):
     coin_name = request.form['coin_name']
     duties = request.form.getlist('duties')
-    requests.put(f'{BACKEND_URL}/coins/{coin_id}', json={'coin_name': coin_name, 'duties': duties})
-    return redirect('/admin/coins')
+    redirect_args = queue_write('PUT', f'coins/{coin_id}', {'coin_name': coin_name, 'duties': duties})
+    return redirect(url_for('admin_coins', **redirect_args))
 
 @app.route('/admin/coins/<string:coin_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def admin_delete_coin(coin_id):
-    requests.delete(f'{BACKEND_URL}/coins/{coin_id}')
-    return redirect('/admin/coins')
+    redirect_args = queue_write('DELETE', f'coins/{coin_id}')
+    return redirect(url_for('admin_coins', **redirect_args))
 
 @app.route('/admin/duties')
 @login_required
 @admin_required
 def admin_duties():
-    duties = requests.get(f'{BACKEND_URL}/duties').json()
-    ksbs = requests.get(f'{BACKEND_URL}/ksbs').json()
-    return render_template('admin/duties.html', duties=duties, ksbs=ksbs,
+    duties, page, pages = get_page('duties')
+    job = job_queue.get(request.args.get('job', type=int))
+    return render_template('admin/duties.html', duties=duties, page=page, pages=pages, job=job,
                            username=session.get('username'), role=session.get('role'))
 
 @app.route('/admin/duties/create', methods=['POST'])
@@ -149,8 +268,8 @@ def admin_create_duty():
     duty_name = request.form['duty_name']
     description = request.form['description']
     ksbs = request.form.getlist('ksbs')
-    requests.post(f'{BACKEND_URL}/duties', json={'duty_name': duty_name, 'description': description, 'ksbs': ksbs})
-    return redirect('/admin/duties')
+    redirect_args = queue_write('POST', 'duties', {'duty_name': duty_name, 'description': description, 'ksbs': ksbs})
+    return redirect(url_for('admin_duties', **redirect_args))
 
 @app.route('/admin/duties/<string:duty_id>/update', methods=['POST'])
 @login_required
@@ -159,15 +278,39 @@ def admin_update_duty(duty_id):
     duty_name = request.form['duty_name']
     description = request.form['description']
     ksbs = request.form.getlist('ksbs')
-    requests.put(f'{BACKEND_URL}/duties/{duty_id}', json={'duty_name': duty_name, 'description': description, 'ksbs': ksbs})
-    return redirect('/admin/duties')
+    redirect_args = queue_write('PUT', f'duties/{duty_id}', {'duty_name': duty_name, 'description': description, 'ksbs': ksbs})
+    return redirect(url_for('admin_duties', **redirect_args))
 
 @app.route('/admin/duties/<string:duty_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def admin_delete_duty(duty_id):
-    requests.delete(f'{BACKEND_URL}/duties/{duty_id}')
-    return redirect('/admin/duties')
+    redirect_args = queue_write('DELETE', f'duties/{duty_id}')
+    return redirect(url_for('admin_duties', **redirect_args))
+
+@app.route('/admin/jobs')
+@login_required
+@admin_required
+def admin_jobs():
+    return render_template('admin/jobs.html', jobs=job_queue.recent(), counts=job_queue.counts(),
+                           username=session.get('username'), role=session.get('role'))
+
+@app.post('/admin/jobs/<int:job_id>/retry')
+@login_required
+@admin_required
+def admin_retry_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    job_queue.submit(job['method'], job['path'], json.loads(job['payload'] or 'null'))
+    return redirect('/admin/jobs')
+
+@app.route('/admin/options/<any(duties, ksbs):entity>')
+@login_required
+@admin_required
+def admin_options(entity):
+    options = backend_request('get', f'{entity}/options', params={'q': request.args.get('q', ''), 'limit': 20})
+    return jsonify(options.json())
 
 @app.route('/admin/logs')
 @login_required
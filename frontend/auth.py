@@ -0,0 +1,170 @@
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import generate_password_hash
+
+class SQLiteSessionStore:
+    # Implements the get/setex/delete subset of the Redis API, so a redis client can be used instead
+    def __init__(self, path):
+        self.path = path
+        self._writes = 0
+        # One connection shared behind a lock: under gevent a thread-local one would be opened per request
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._lock = Lock()
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def get(self, key):
+        rows = self._execute("SELECT data FROM sessions WHERE id = ? AND expires > ?", (key, time.time()))
+        return rows[0][0] if rows else None
+
+    def setex(self, key, ttl, value):
+        self._execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)", (key, value, time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+    def delete(self, key):
+        self._execute("DELETE FROM sessions WHERE id = ?", (key,))
+
+def create_session_store(url):
+    if url.startswith(("redis://", "rediss://")):
+        import redis
+        return redis.Redis.from_url(url)
+    return SQLiteSessionStore(url.removeprefix("sqlite:///"))
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class ServerSideSessionInterface(SessionInterface):
+    # The cookie only carries a random session id; the data stays in the store
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, prefix="session:"):
+        self.store = store
+        self.prefix = prefix
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(self.prefix + sid)
+            if data is not None:
+                return ServerSideSession(self.serializer.loads(data), sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(self.prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.modified:
+            # A fresh id on every change stops a pre-login id from being reused after login
+            self.store.delete(self.prefix + session.sid)
+            session.sid = secrets.token_urlsafe(32)
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        self.store.setex(self.prefix + session.sid, ttl, self.serializer.dumps(dict(session)))
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add("Cookie")
+
+@lru_cache
+def _hash_prefix(method):
+    return generate_password_hash('', method=method).split('$')[0]
+
+def needs_rehash(password_hash, method):
+    # The part before the first '$' names the algorithm and its cost parameters
+    return password_hash.split('$')[0] != _hash_prefix(method)
+
+class UserCache:
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._users = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, username, load):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._users.get(username)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        user = load(username)
+        if user is None:
+            # Unknown names are not cached, so a user created after a failed attempt can log in at once
+            return None
+        with self._lock:
+            self._users[username] = (now + self.ttl, user)
+            self._users.move_to_end(username)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, username):
+        with self._lock:
+            self._users.pop(username, None)
+
+class RateLimiter:
+    # Token bucket per client, charged for failed attempts: each client costs one (tokens, timestamp) entry
+    def __init__(self, rate, burst, max_clients=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def _refill(self, client, now):
+        tokens, last = self._buckets.pop(client, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def allowed(self, client):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                return True
+            return min(self.burst, bucket[0] + (time.monotonic() - bucket[1]) * self.rate) >= 1
+
+    def hit(self, client):
+        now = time.monotonic()
+        with self._lock:
+            self._buckets[client] = (max(self._refill(client, now) - 1, 0), now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
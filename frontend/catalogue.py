@@ -0,0 +1,123 @@
+from threading import RLock
+
+import codec
+
+ENTITIES = {"coin": "coins", "duty": "duties", "ksb": "ksbs"}
+ASSOCIATIONS = {"coin_duty": ("coin_id", "duty_id"), "duty_ksb": ("duty_id", "ksb_id")}
+
+class CatalogueReplica:
+    def __init__(self, request, page_size=500):
+        # request(method, path, **kwargs) sends a request to the backend and returns the response
+        self.request = request
+        self.page_size = page_size
+        self.seq = None
+        self.listeners = []
+        self._lock = RLock()
+        self._reset()
+
+    def _reset(self):
+        self.coins = {}
+        self.duties = {}
+        self.ksbs = {}
+        self.coin_duties = {}
+        self.duty_ksbs = {}
+
+    def _get(self, path, **params):
+        response = self.request('get', path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def _get_items(self, path):
+        response = self.request('get', path, headers={'Accept': codec.ACCEPT})
+        response.raise_for_status()
+        return codec.decode(response)['items']
+
+    def sync(self):
+        with self._lock:
+            if self.seq is None:
+                self._load()
+            else:
+                self._pull_changes()
+        return self.seq
+
+    def _load(self):
+        # Changes made while loading are replayed afterwards, and applying them twice is harmless
+        seq = self._get('version')['version']
+        self._reset()
+        # The compact format already refers to duties and KSBs by id, which is how the replica stores them
+        for ksb in self._get_items('ksbs'):
+            self.ksbs[ksb['id']] = ksb
+        for duty in self._get_items('duties'):
+            self.duty_ksbs[duty['id']] = duty.pop('ksbs')
+            self.duties[duty['id']] = duty
+        for coin in self._get_items('coins'):
+            self.coin_duties[coin['id']] = coin.pop('duties')
+            self.coins[coin['id']] = coin
+        self.seq = seq
+        self._pull_changes()
+
+    def _pull_changes(self):
+        while True:
+            page = self._get('changes', since=self.seq, limit=self.page_size)
+            for change in page['changes']:
+                if change['entity'] == 'catalogue':
+                    # A bulk import bypassed the change feed, so start again from a full load
+                    for listener in self.listeners:
+                        listener(change)
+                    return self._load()
+                self.apply(change)
+                self.seq = change['seq']
+                for listener in self.listeners:
+                    listener(change)
+            if len(page['changes']) < self.page_size:
+                return
+
+    def apply(self, change):
+        entity, op = change['entity'], change['op']
+        if entity in ENTITIES:
+            items = getattr(self, ENTITIES[entity])
+            if op == 'delete':
+                items.pop(change['id'], None)
+                self._unlink(entity, change['id'])
+            else:
+                items[change['id']] = change['data']
+        elif entity in ASSOCIATIONS:
+            left, right = ASSOCIATIONS[entity]
+            links = self.coin_duties if entity == 'coin_duty' else self.duty_ksbs
+            linked = links.setdefault(change['data'][left], [])
+            if op == 'delete':
+                if change['data'][right] in linked:
+                    linked.remove(change['data'][right])
+            elif change['data'][right] not in linked:
+                linked.append(change['data'][right])
+
+    def _unlink(self, entity, id):
+        if entity == 'coin':
+            self.coin_duties.pop(id, None)
+        elif entity == 'duty':
+            self.duty_ksbs.pop(id, None)
+            for duty_ids in self.coin_duties.values():
+                if id in duty_ids:
+                    duty_ids.remove(id)
+        elif entity == 'ksb':
+            for ksb_ids in self.duty_ksbs.values():
+                if id in ksb_ids:
+                    ksb_ids.remove(id)
+
+    def duty(self, duty_id):
+        with self._lock:
+            if duty_id not in self.duties:
+                return None
+            ksbs = [self.ksbs[k] for k in self.duty_ksbs.get(duty_id, []) if k in self.ksbs]
+            return dict(self.duties[duty_id], ksbs=ksbs)
+
+    def coin_list(self):
+        with self._lock:
+            return [
+                dict(coin, duties=[self.duty(d) for d in self.coin_duties.get(coin['id'], []) if d in self.duties])
+                for coin in self.coins.values()
+            ]
+
+    def coins_with_duty(self, duty_id):
+        with self._lock:
+            return [coin for coin in self.coin_list() if duty_id in self.coin_duties.get(coin['id'], [])]
@@ -0,0 +1,57 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COMPACT_JSON = "application/vnd.catalogue.compact+json"
+MSGPACK = "application/msgpack"
+ACCEPT = ", ".join(([MSGPACK] if msgpack else []) + [COMPACT_JSON, "application/json;q=0.5"])
+
+# nested lists the backend replaces with id references, keyed by field name
+REFERENCES = ("duties", "ksbs")
+
+def normalise(items):
+    document = {"items": []}
+
+    def collapse(item):
+        item = dict(item)
+        for key in REFERENCES:
+            if key in item:
+                table = document.setdefault(key, {})
+                for child in item[key]:
+                    if child["id"] not in table:
+                        table[child["id"]] = collapse(child)
+                item[key] = [child["id"] for child in item[key]]
+        return item
+
+    document["items"] = [collapse(item) for item in items]
+    return document
+
+def expand(document):
+    # Nested objects are shared between the items that refer to them, so they are built once
+    expanded = {}
+
+    def resolve(key, ref):
+        if (key, ref) not in expanded:
+            expanded[key, ref] = resolve_item(document[key][ref])
+        return expanded[key, ref]
+
+    def resolve_item(item):
+        item = dict(item)
+        for key in REFERENCES:
+            if key in item:
+                item[key] = [resolve(key, ref) for ref in item[key]]
+        return item
+
+    return [resolve_item(item) for item in document["items"]]
+
+def decode(response):
+    # Backends without the compact format answer with nested JSON, which is normalised here
+    mimetype = response.headers.get("Content-Type", "").split(";")[0].strip()
+    if mimetype == MSGPACK and msgpack:
+        return msgpack.unpackb(response.content)
+    if mimetype == COMPACT_JSON:
+        return json.loads(response.content)
+    return normalise(response.json())
@@ -0,0 +1,99 @@
+import json
+import time
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+from threading import Condition, Lock, Thread
+
+class Broadcaster:
+    # Messages live in one shared ring buffer and each subscriber only keeps
+    # its last seen id, so idle connections cost no memory beyond their socket
+    def __init__(self, capacity=1000, max_subscribers=5000, heartbeat=15):
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.last_id = 0
+        self.subscribers = 0
+        self._messages = deque(maxlen=capacity)
+        # Every message with a higher id is still in the buffer; None until the first publish or seed.
+        # Ids are not contiguous, because the change feed skips changes made in other standards.
+        self._complete_after = None
+        self._condition = Condition()
+
+    def publish(self, id, data):
+        with self._condition:
+            if self._complete_after is None:
+                self._complete_after = id - 1
+            elif len(self._messages) == self._messages.maxlen:
+                self._complete_after = self._messages[0][0]
+            self._messages.append((id, data))
+            self.last_id = max(self.last_id, id)
+            self._condition.notify_all()
+
+    def seed(self, id):
+        # Nothing up to the first seeded id was published here, so clients behind it have to resync
+        with self._condition:
+            if self._complete_after is None:
+                self._complete_after = id
+            self.last_id = max(self.last_id, id)
+
+    def _missed(self, after_id):
+        return self._complete_after is not None and after_id < self._complete_after
+
+    def _newer(self, after_id):
+        return bool(self._messages) and self._messages[-1][0] > after_id
+
+    def wait(self, after_id, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self._missed(after_id) or self._newer(after_id), timeout)
+            if self._missed(after_id):
+                return None
+            start = bisect_right(self._messages, after_id, key=lambda message: message[0])
+            return list(islice(self._messages, start, None))
+
+    def subscribe(self):
+        with self._condition:
+            if self.subscribers >= self.max_subscribers:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def stream(self, last_id):
+        yield "retry: 3000\n\n"
+        while True:
+            messages = self.wait(last_id, self.heartbeat)
+            if messages is None:
+                last_id = self.last_id
+                yield f"id: {last_id}\nevent: resync\ndata: {{}}\n\n"
+            elif not messages:
+                yield ": keep-alive\n\n"
+            for id, data in messages or ():
+                last_id = id
+                yield f"id: {id}\ndata: {data}\n\n"
+
+def change_message(change):
+    return json.dumps({k: change[k] for k in ("entity", "op", "id", "data")}, separators=(",", ":"))
+
+class Poller:
+    def __init__(self, poll, interval):
+        self.poll = poll
+        self.interval = interval
+        self._thread = None
+        self._lock = Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                pass
+            time.sleep(self.interval)
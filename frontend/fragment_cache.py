@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from threading import Lock
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+class FragmentCache:
+    # Each fragment name has its own LRU, so many duty pages cannot evict the coin list
+    def __init__(self, max_size=256, limits=None):
+        self.max_size = max_size
+        self.limits = dict(limits or {})
+        self._fragments = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            fragments = self._fragments.get(key[0])
+            fragment = fragments.get(key) if fragments is not None else None
+            if fragment is not None:
+                fragments.move_to_end(key)
+            return fragment
+
+    def set(self, key, fragment):
+        name = key[0]
+        with self._lock:
+            fragments = self._fragments.setdefault(name, OrderedDict())
+            fragments[key] = fragment
+            fragments.move_to_end(key)
+            while len(fragments) > self.limits.get(name, self.max_size):
+                fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+class FragmentCacheExtension(Extension):
+    # {% cache 'name', key, ... %}...{% endcache %} renders the body once per key
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render_cached", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        key = tuple(key)
+        fragment = self.environment.fragment_cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            self.environment.fragment_cache.set(key, fragment)
+        return fragment
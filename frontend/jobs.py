@@ -0,0 +1,142 @@
+import json
+import sqlite3
+import time
+from threading import Condition, Lock, RLock, Thread
+
+# Client errors other than these will fail the same way on every retry
+RETRY_STATUSES = {408, 425, 429}
+FINISHED = ("done", "failed", "superseded")
+
+class JobQueue:
+    # Backend writes are stored in SQLite and applied in submission order by one worker thread
+    def __init__(self, path, send, on_done=None, max_attempts=5, backoff=1.0, max_backoff=60.0):
+        self.path = path
+        self.send = send
+        self.on_done = on_done
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._condition = Condition()
+        self._thread = None
+        self._lock = Lock()
+        # One connection shared behind a lock: under gevent a thread-local one would be opened per request
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._db_lock = RLock()
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, method TEXT NOT NULL, path TEXT NOT NULL, payload TEXT, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, "
+            "error TEXT, superseded_by INTEGER, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, id)")
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                # Jobs left running by a previous process are tried again
+                self._execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def submit(self, method, path, payload=None):
+        now = time.time()
+        with self._db_lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                job_id = connection.execute(
+                    "INSERT INTO jobs (method, path, payload, status, next_attempt, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+                    (method, path, json.dumps(payload) if payload is not None else None, now, now, now)
+                ).lastrowid
+                if method in ("PUT", "DELETE"):
+                    # A later edit or delete of the same entity replaces edits that have not been sent yet.
+                    # Only a delete replaces a pending delete, so an edit can never undo one.
+                    replaced = ("PUT",) if method == "PUT" else ("PUT", "DELETE")
+                    connection.execute(
+                        "UPDATE jobs SET status = 'superseded', superseded_by = ?, updated_at = ? "
+                        f"WHERE status = 'pending' AND path = ? AND method IN ({', '.join('?' * len(replaced))}) AND id < ?",
+                        (job_id, now, path, *replaced, job_id)
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+        with self._condition:
+            self._condition.notify_all()
+        return job_id
+
+    def get(self, job_id):
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    def wait(self, job_id, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                job = self.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINISHED or remaining <= 0:
+                    return job
+                self._condition.wait(remaining)
+
+    def recent(self, limit=50):
+        rows = self._execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        rows = self._execute("SELECT status, count(*) FROM jobs GROUP BY status")
+        return {row[0]: row[1] for row in rows}
+
+    def _next_job(self):
+        rows = self._execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1")
+        return dict(rows[0]) if rows else None
+
+    def _finish(self, job, status, error=None, next_attempt=None):
+        self._execute(
+            "UPDATE jobs SET status = ?, attempts = ?, error = ?, next_attempt = ?, updated_at = ? WHERE id = ?",
+            (status, job["attempts"], error, next_attempt or job["next_attempt"], time.time(), job["id"])
+        )
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                delay = job["next_attempt"] - time.time() if job else None
+                if job is None or delay > 0:
+                    # The oldest job blocks the rest until it is due, so writes never overtake each other
+                    self._condition.wait(delay)
+                    continue
+            self._process(job)
+
+    def _process(self, job):
+        self._execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?", (time.time(), job["id"]))
+        job["attempts"] += 1
+        try:
+            status_code, error = self.send(job["method"], job["path"], json.loads(job["payload"] or "null"))
+        except Exception as exception:
+            status_code, error = None, str(exception) or type(exception).__name__
+
+        if status_code is not None and status_code < 400:
+            self._finish(job, "done")
+            if self.on_done:
+                try:
+                    self.on_done(job)
+                except Exception:
+                    pass
+        elif status_code is not None and status_code < 500 and status_code not in RETRY_STATUSES:
+            self._finish(job, "failed", f"{status_code}: {error}")
+        elif job["attempts"] >= self.max_attempts:
+            self._finish(job, "failed", f"{status_code or 'error'}: {error}")
+        else:
+            backoff = min(self.backoff * 2 ** (job["attempts"] - 1), self.max_backoff)
+            self._finish(job, "pending", f"{status_code or 'error'}: {error}", time.time() + backoff)
@@ -1,12 +1,12 @@
-from app import app, db, User
+from app import app, db, User, PASSWORD_HASH_METHOD
 from werkzeug.security import generate_password_hash
 
 with app.app_context():
     db.create_all()
 
     users = [
-        User(username='admin', password=generate_password_hash('adminpass'), role='admin'),
-        User(username='user', password=generate_password_hash('userpass'), role='authenticated'),
+        User(username='admin', password=generate_password_hash('adminpass', method=PASSWORD_HASH_METHOD), role='admin'),
+        User(username='user', password=generate_password_hash('userpass', method=PASSWORD_HASH_METHOD), role='authenticated'),
     ]
 
     for user in users:
@@ -0,0 +1,241 @@
+from threading import Thread
+
+import pytest
+from flask import Flask, session
+from werkzeug.security import generate_password_hash
+
+import auth
+from auth import RateLimiter, ServerSideSessionInterface, SQLiteSessionStore, UserCache, needs_rehash
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth.time, "monotonic", clock)
+    return clock
+
+class TestRateLimiter:
+    def test_new_clients_are_allowed(self, clock):
+        assert RateLimiter(rate=1, burst=5).allowed("1.2.3.4")
+
+    def test_clients_are_locked_out_after_the_burst(self, clock):
+        limiter = RateLimiter(rate=0.2, burst=5)
+
+        for _ in range(4):
+            limiter.hit("1.2.3.4")
+        assert limiter.allowed("1.2.3.4")
+
+        limiter.hit("1.2.3.4")
+        assert not limiter.allowed("1.2.3.4")
+        assert limiter.allowed("5.6.7.8")
+
+    def test_tokens_refill_at_the_rate(self, clock):
+        limiter = RateLimiter(rate=0.2, burst=5)
+        for _ in range(5):
+            limiter.hit("1.2.3.4")
+
+        clock.advance(4.9)
+        assert not limiter.allowed("1.2.3.4")
+
+        clock.advance(0.1)
+        assert limiter.allowed("1.2.3.4")
+
+        limiter.hit("1.2.3.4")
+        assert not limiter.allowed("1.2.3.4")
+
+    def test_tokens_never_exceed_the_burst(self, clock):
+        limiter = RateLimiter(rate=1, burst=2)
+        limiter.hit("1.2.3.4")
+
+        clock.advance(3600)
+        limiter.hit("1.2.3.4")
+        limiter.hit("1.2.3.4")
+
+        assert not limiter.allowed("1.2.3.4")
+
+    def test_least_recently_hit_clients_are_evicted(self, clock):
+        limiter = RateLimiter(rate=0.01, burst=1, max_clients=2)
+        limiter.hit("a")
+        limiter.hit("b")
+        limiter.hit("a")
+
+        limiter.hit("c")
+
+        assert limiter.allowed("b")
+        assert not limiter.allowed("a")
+        assert not limiter.allowed("c")
+
+class TestUserCache:
+    def loader(self):
+        calls = []
+
+        def load(username):
+            calls.append(username)
+            return ("hash", "admin") if username != "missing" else None
+        return load, calls
+
+    def test_users_are_loaded_once_within_the_ttl(self, clock):
+        cache = UserCache(ttl=60)
+        load, calls = self.loader()
+
+        assert cache.get("alice", load) == ("hash", "admin")
+        clock.advance(59)
+        assert cache.get("alice", load) == ("hash", "admin")
+        assert calls == ["alice"]
+
+    def test_missing_users_are_not_cached(self, clock):
+        cache = UserCache(ttl=60)
+        load, calls = self.loader()
+
+        assert cache.get("missing", load) is None
+        assert cache.get("missing", load) is None
+        assert calls == ["missing", "missing"]
+
+    def test_users_are_reloaded_after_the_ttl(self, clock):
+        cache = UserCache(ttl=60)
+        load, calls = self.loader()
+
+        cache.get("alice", load)
+        clock.advance(60)
+        cache.get("alice", load)
+
+        assert calls == ["alice", "alice"]
+
+    def test_invalidate_forces_a_reload(self, clock):
+        cache = UserCache(ttl=60)
+        load, calls = self.loader()
+
+        cache.get("alice", load)
+        cache.invalidate("alice")
+        cache.get("alice", load)
+
+        assert calls == ["alice", "alice"]
+
+    def test_oldest_entries_are_evicted_at_max_size(self, clock):
+        cache = UserCache(ttl=60, max_size=2)
+        load, calls = self.loader()
+
+        for username in ["alice", "bob", "carol"]:
+            cache.get(username, load)
+        cache.get("carol", load)
+        cache.get("bob", load)
+        cache.get("alice", load)
+
+        assert calls == ["alice", "bob", "carol", "alice"]
+
+class TestNeedsRehash:
+    def test_hashes_made_with_the_current_method_are_kept(self):
+        method = "pbkdf2:sha256:1000"
+
+        assert not needs_rehash(generate_password_hash("secret", method=method), method)
+
+    def test_other_methods_or_costs_are_rehashed(self):
+        password_hash = generate_password_hash("secret", method="pbkdf2:sha256:1000")
+
+        assert needs_rehash(password_hash, "pbkdf2:sha256:2000")
+        assert needs_rehash(password_hash, "scrypt")
+
+class TestServerSideSession:
+    @pytest.fixture
+    def store(self, tmp_path):
+        return SQLiteSessionStore(str(tmp_path / "sessions.sqlite"))
+
+    @pytest.fixture
+    def client(self, store):
+        app = Flask(__name__)
+        app.secret_key = "test"
+        app.session_interface = ServerSideSessionInterface(store)
+
+        @app.route("/visit")
+        def visit():
+            session["visited"] = True
+            return ""
+
+        @app.route("/login")
+        def login():
+            session["username"] = "alice"
+            return ""
+
+        @app.route("/whoami")
+        def whoami():
+            return session.get("username", "")
+
+        @app.route("/logout")
+        def logout():
+            session.clear()
+            return ""
+
+        return app.test_client()
+
+    def session_id(self, client):
+        cookie = client.get_cookie("session")
+        return cookie.value if cookie else None
+
+    def test_only_the_session_id_is_sent_to_the_browser(self, client, store):
+        client.get("/login")
+        sid = self.session_id(client)
+
+        assert "alice" not in sid
+        assert store.get("session:" + sid) is not None
+        assert client.get("/whoami").text == "alice"
+
+    def test_session_id_changes_on_login(self, client, store):
+        client.get("/visit")
+        anonymous_sid = self.session_id(client)
+
+        client.get("/login")
+        sid = self.session_id(client)
+
+        assert sid != anonymous_sid
+        assert store.get("session:" + anonymous_sid) is None
+        assert client.get("/whoami").text == "alice"
+
+    def test_unchanged_sessions_keep_their_id(self, client):
+        client.get("/login")
+        sid = self.session_id(client)
+
+        client.get("/whoami")
+
+        assert self.session_id(client) == sid
+
+    def test_logout_deletes_the_stored_session(self, client, store):
+        client.get("/login")
+        sid = self.session_id(client)
+
+        client.get("/logout")
+
+        assert store.get("session:" + sid) is None
+        assert self.session_id(client) is None
+        assert client.get("/whoami").text == ""
+
+    def test_a_stolen_id_stops_working_after_logout(self, client, store):
+        client.get("/login")
+        sid = self.session_id(client)
+        client.get("/logout")
+
+        client.set_cookie("session", sid)
+
+        assert client.get("/whoami").text == ""
+
+    def test_expired_sessions_are_ignored(self, store):
+        store.setex("session:old", -1, b"{}")
+
+        assert store.get("session:old") is None
+
+    def test_store_shares_one_connection_between_threads(self, store):
+        connection = store._connection
+        writer = Thread(target=lambda: store.setex("session:a", 60, b"{}"))
+        writer.start()
+        writer.join()
+
+        assert store.get("session:a") == b"{}"
+        assert store._connection is connection
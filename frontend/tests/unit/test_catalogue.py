@@ -0,0 +1,171 @@
+import json
+
+import pytest
+
+from catalogue import CatalogueReplica
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/json"}
+        self.content = json.dumps(body).encode()
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"{self.status_code} error")
+
+class FakeBackend:
+    # Serves nested JSON lists and a change feed like the backend does, without the compact format
+    def __init__(self):
+        self.ksbs, self.duties, self.coins = [], [], []
+        self.changes = []
+        self.version = 0
+        self.paths = []
+
+    def change(self, entity, op, id, data=None, seq=None):
+        self.version = seq or self.version + 1
+        self.changes.append({"seq": self.version, "entity": entity, "op": op, "id": id, "data": data})
+
+    def __call__(self, method, path, params=None, headers=None):
+        self.paths.append(path)
+        if path == "version":
+            return FakeResponse({"version": self.version})
+        if path == "changes":
+            since, limit = params["since"], params["limit"]
+            changes = [c for c in self.changes if c["seq"] > since][:limit]
+            return FakeResponse({"changes": changes, "last_seq": self.version})
+        if path in ("ksbs", "duties", "coins"):
+            return FakeResponse(getattr(self, path))
+        return FakeResponse({"error": "Not Found"}, 404)
+
+KSB = {"id": "k1", "ksb_name": "K1", "description": "Knowledge"}
+DUTY = {"id": "d1", "duty_name": "A duty", "description": "A description", "ksbs": [KSB]}
+COIN = {"id": "c1", "coin_name": "A coin", "duties": [DUTY]}
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend()
+    backend.ksbs = [KSB]
+    backend.duties = [DUTY]
+    backend.coins = [COIN]
+    backend.version = 10
+    return backend
+
+@pytest.fixture
+def replica(backend):
+    replica = CatalogueReplica(backend, page_size=2)
+    replica.sync()
+    return replica
+
+def test_load_stores_tables_by_id(replica):
+    assert replica.seq == 10
+    assert replica.ksbs == {"k1": KSB}
+    assert replica.duty_ksbs == {"d1": ["k1"]}
+    assert replica.coin_duties == {"c1": ["d1"]}
+    assert replica.coin_list() == [COIN]
+    assert replica.duty("d1") == DUTY
+    assert replica.duty("missing") is None
+
+def test_entity_changes_are_applied(replica, backend):
+    backend.change("coin", "update", "c1", {"id": "c1", "coin_name": "A new coin"})
+    backend.change("duty", "insert", "d2", {"id": "d2", "duty_name": "Another duty", "description": "Another description"})
+    backend.change("coin_duty", "insert", "c1:d2", {"coin_id": "c1", "duty_id": "d2"})
+
+    assert replica.sync() == 13
+    assert replica.coins["c1"]["coin_name"] == "A new coin"
+    assert replica.coin_duties["c1"] == ["d1", "d2"]
+    assert [c["id"] for c in replica.coins_with_duty("d2")] == ["c1"]
+
+def test_association_changes_are_idempotent(replica, backend):
+    backend.change("duty_ksb", "insert", "d1:k1", {"duty_id": "d1", "ksb_id": "k1"})
+    backend.change("duty_ksb", "delete", "d1:k1", {"duty_id": "d1", "ksb_id": "k1"})
+    backend.change("duty_ksb", "delete", "d1:k1", {"duty_id": "d1", "ksb_id": "k1"})
+
+    replica.sync()
+
+    assert replica.duty_ksbs["d1"] == []
+
+def test_deleting_a_ksb_unlinks_it_from_duties(replica, backend):
+    backend.change("ksb", "delete", "k1")
+
+    replica.sync()
+
+    assert replica.ksbs == {}
+    assert replica.duty("d1")["ksbs"] == []
+
+def test_deleting_a_duty_unlinks_it_from_coins(replica, backend):
+    backend.change("duty", "delete", "d1")
+
+    replica.sync()
+
+    assert "d1" not in replica.duty_ksbs
+    assert replica.coin_duties["c1"] == []
+    assert replica.coin_list()[0]["duties"] == []
+
+def test_deleting_a_coin_drops_its_links(replica, backend):
+    backend.change("coin", "delete", "c1")
+
+    replica.sync()
+
+    assert replica.coins == {}
+    assert replica.coin_duties == {}
+
+def test_changes_are_paged_until_the_feed_is_drained(replica, backend):
+    for number in range(5):
+        backend.change("ksb", "insert", f"k{number + 2}", {"id": f"k{number + 2}", "ksb_name": f"K{number + 2}", "description": ""})
+    backend.paths.clear()
+
+    assert replica.sync() == 15
+
+    assert len(replica.ksbs) == 6
+    assert backend.paths == ["changes"] * 3
+
+def test_seq_follows_gaps_in_the_feed(replica, backend):
+    # Changes in other standards use up sequence numbers without appearing in this feed
+    backend.change("coin", "update", "c1", {"id": "c1", "coin_name": "A new coin"}, seq=14)
+
+    assert replica.sync() == 14
+    assert replica.sync() == 14
+
+def test_listeners_get_each_applied_change(replica, backend):
+    seen = []
+    replica.listeners.append(lambda change: seen.append(change["seq"]))
+    backend.change("coin", "update", "c1", {"id": "c1", "coin_name": "A new coin"})
+    backend.change("coin", "delete", "c1")
+
+    replica.sync()
+
+    assert seen == [11, 12]
+
+def test_catalogue_reload_starts_again_from_a_full_load(replica, backend):
+    seen = []
+    replica.listeners.append(lambda change: seen.append(change["entity"]))
+    backend.coins = [dict(COIN, coin_name="Imported coin")]
+    backend.change("catalogue", "reload", "catalogue")
+    backend.paths.clear()
+
+    assert replica.sync() == 11
+
+    assert seen == ["catalogue"]
+    assert replica.coins["c1"]["coin_name"] == "Imported coin"
+    assert backend.paths == ["changes", "version", "ksbs", "duties", "coins", "changes"]
+
+def test_changes_made_during_a_load_are_replayed(backend):
+    # The version is read first, so a change made while the lists are fetched is applied again
+    backend.change("ksb", "insert", "k1", KSB, seq=10)
+    replica = CatalogueReplica(backend)
+    backend.version = 9
+
+    assert replica.sync() == 10
+    assert replica.ksbs == {"k1": KSB}
+
+def test_backend_errors_are_raised(backend):
+    replica = CatalogueReplica(lambda method, path, **kwargs: FakeResponse({}, 500))
+
+    with pytest.raises(RuntimeError):
+        replica.sync()
+    assert replica.seq is None
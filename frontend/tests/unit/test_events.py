@@ -0,0 +1,120 @@
+import json
+from threading import Thread
+
+from events import Broadcaster, change_message
+
+def publish_all(broadcaster, ids):
+    for id in ids:
+        broadcaster.publish(id, f"message {id}")
+
+def ids(messages):
+    return [id for id, _ in messages]
+
+class TestBroadcaster:
+    def test_returns_messages_after_the_given_id(self):
+        broadcaster = Broadcaster()
+        publish_all(broadcaster, [1, 2, 3])
+
+        assert broadcaster.wait(1, 0) == [(2, "message 2"), (3, "message 3")]
+
+    def test_ids_may_have_gaps(self):
+        broadcaster = Broadcaster()
+        publish_all(broadcaster, [5, 7, 8, 9])
+
+        assert ids(broadcaster.wait(7, 0)) == [8, 9]
+        assert ids(broadcaster.wait(6, 0)) == [7, 8, 9]
+        assert ids(broadcaster.wait(4, 0)) == [5, 7, 8, 9]
+
+    def test_up_to_date_clients_get_nothing_after_the_timeout(self):
+        broadcaster = Broadcaster()
+        publish_all(broadcaster, [1, 2])
+
+        assert broadcaster.wait(2, 0.01) == []
+
+    def test_waiting_clients_are_woken_by_a_publish(self):
+        broadcaster = Broadcaster()
+        broadcaster.seed(10)
+        result = []
+        waiter = Thread(target=lambda: result.append(broadcaster.wait(10, 5)))
+        waiter.start()
+
+        broadcaster.publish(12, "message 12")
+        waiter.join(5)
+
+        assert result == [[(12, "message 12")]]
+
+    def test_clients_at_the_seeded_id_do_not_resync(self):
+        broadcaster = Broadcaster()
+        broadcaster.seed(10)
+        broadcaster.publish(12, "message 12")
+
+        assert ids(broadcaster.wait(10, 0)) == [12]
+
+    def test_clients_older_than_the_seeded_id_resync(self):
+        broadcaster = Broadcaster()
+        broadcaster.seed(10)
+
+        assert broadcaster.wait(3, 0) is None
+
+    def test_later_seeds_do_not_force_a_resync(self):
+        broadcaster = Broadcaster()
+        broadcaster.seed(10)
+        broadcaster.publish(12, "message 12")
+        broadcaster.seed(15)
+
+        assert ids(broadcaster.wait(10, 0)) == [12]
+        assert broadcaster.last_id == 15
+
+    def test_clients_older_than_the_buffer_resync(self):
+        broadcaster = Broadcaster(capacity=3)
+        publish_all(broadcaster, [1, 3, 5, 7, 9])
+
+        assert broadcaster.wait(2, 0) is None
+        assert ids(broadcaster.wait(3, 0)) == [5, 7, 9]
+        assert ids(broadcaster.wait(6, 0)) == [7, 9]
+
+    def test_subscribers_are_capped(self):
+        broadcaster = Broadcaster(max_subscribers=2)
+
+        assert broadcaster.subscribe()
+        assert broadcaster.subscribe()
+        assert not broadcaster.subscribe()
+
+        broadcaster.unsubscribe()
+        assert broadcaster.subscribe()
+
+class TestStream:
+    def test_stream_sends_messages_with_their_ids(self):
+        broadcaster = Broadcaster()
+        publish_all(broadcaster, [5, 7])
+        stream = broadcaster.stream(4)
+
+        assert next(stream) == "retry: 3000\n\n"
+        assert next(stream) == "id: 5\ndata: message 5\n\n"
+        assert next(stream) == "id: 7\ndata: message 7\n\n"
+
+    def test_stream_sends_heartbeats_when_idle(self):
+        broadcaster = Broadcaster(heartbeat=0.01)
+        broadcaster.seed(3)
+        stream = broadcaster.stream(3)
+        next(stream)
+
+        assert next(stream) == ": keep-alive\n\n"
+        assert next(stream) == ": keep-alive\n\n"
+
+    def test_stream_resyncs_and_carries_on_from_the_latest_id(self):
+        broadcaster = Broadcaster(capacity=2, heartbeat=0.01)
+        publish_all(broadcaster, [1, 2, 3])
+        stream = broadcaster.stream(0)
+        next(stream)
+
+        assert next(stream) == "id: 3\nevent: resync\ndata: {}\n\n"
+        assert next(stream) == ": keep-alive\n\n"
+
+        broadcaster.publish(4, "message 4")
+        assert next(stream) == "id: 4\ndata: message 4\n\n"
+
+def test_change_message_keeps_the_public_fields():
+    change = {"seq": 3, "entity": "coin", "op": "update", "id": "c1", "data": {"coin_name": "A coin"}}
+
+    assert json.loads(change_message(change)) == {"entity": "coin", "op": "update", "id": "c1", "data": {"coin_name": "A coin"}}
@@ -0,0 +1,177 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from jinja2 import DictLoader, Environment, FileSystemLoader
+
+from fragment_cache import FragmentCache, FragmentCacheExtension
+
+TEMPLATES = os.path.join(os.path.dirname(__file__), "..", "..", "templates")
+
+class CountingLoader:
+    # Stands in for load_coins/load_duty and records how often the body actually ran
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+@pytest.fixture
+def environment():
+    return Environment(loader=FileSystemLoader(TEMPLATES), extensions=[FragmentCacheExtension])
+
+def test_get_returns_stored_fragment():
+    cache = FragmentCache()
+    cache.set(("coins", 1), "<ul></ul>")
+
+    assert cache.get(("coins", 1)) == "<ul></ul>"
+    assert cache.get(("coins", 2)) is None
+    assert cache.get(("duty", 1)) is None
+
+def test_least_recently_used_fragment_is_evicted():
+    cache = FragmentCache(max_size=2)
+    cache.set(("duty", 1, "a"), "a")
+    cache.set(("duty", 1, "b"), "b")
+    cache.get(("duty", 1, "a"))
+    cache.set(("duty", 1, "c"), "c")
+
+    assert cache.get(("duty", 1, "a")) == "a"
+    assert cache.get(("duty", 1, "b")) is None
+    assert cache.get(("duty", 1, "c")) == "c"
+
+def test_setting_an_existing_key_refreshes_it():
+    cache = FragmentCache(max_size=2)
+    cache.set(("duty", 1, "a"), "old")
+    cache.set(("duty", 1, "b"), "b")
+    cache.set(("duty", 1, "a"), "new")
+    cache.set(("duty", 1, "c"), "c")
+
+    assert cache.get(("duty", 1, "a")) == "new"
+    assert cache.get(("duty", 1, "b")) is None
+
+def test_duty_pages_do_not_evict_the_coin_list():
+    cache = FragmentCache(max_size=3)
+    cache.set(("coins", 1, False, 0), "coins")
+    for duty_id in range(10):
+        cache.set(("duty", 1, str(duty_id)), duty_id)
+
+    assert cache.get(("coins", 1, False, 0)) == "coins"
+    assert cache.get(("duty", 1, "9")) == 9
+    assert cache.get(("duty", 1, "6")) is None
+
+def test_limits_apply_per_fragment_name():
+    cache = FragmentCache(max_size=3, limits={"coins": 1})
+    cache.set(("coins", 1, False, 0), "old")
+    cache.set(("coins", 1, False, 1), "new")
+    for duty_id in range(3):
+        cache.set(("duty", 1, str(duty_id)), duty_id)
+
+    assert cache.get(("coins", 1, False, 0)) is None
+    assert cache.get(("coins", 1, False, 1)) == "new"
+    assert [cache.get(("duty", 1, str(duty_id))) for duty_id in range(3)] == [0, 1, 2]
+
+def test_clear_drops_every_fragment():
+    cache = FragmentCache()
+    cache.set(("coins", 1), "coins")
+    cache.set(("duty", 1, "a"), "duty")
+    cache.clear()
+
+    assert cache.get(("coins", 1)) is None
+    assert cache.get(("duty", 1, "a")) is None
+
+def test_extension_gives_each_environment_its_own_cache():
+    first = Environment(extensions=[FragmentCacheExtension])
+    second = Environment(extensions=[FragmentCacheExtension])
+
+    assert isinstance(first.fragment_cache, FragmentCache)
+    assert first.fragment_cache is not second.fragment_cache
+
+def test_cache_tag_renders_body_once_per_key():
+    environment = Environment(
+        loader=DictLoader({"page": "{% cache 'page', version %}{{ load() }}{% endcache %}"}),
+        extensions=[FragmentCacheExtension],
+    )
+    load = CountingLoader("body")
+    template = environment.get_template("page")
+
+    assert template.render(load=load, version=1) == "body"
+    assert template.render(load=load, version=1) == "body"
+    assert load.calls == 1
+    template.render(load=load, version=2)
+    assert load.calls == 2
+
+def index_context(load_coins, **context):
+    return {"load_coins": load_coins, "version": 1, "completions_version": 0, "role": None, **context}
+
+def test_index_renders_coins_once_per_version(environment):
+    coin = SimpleNamespace(id="c1", coin_name="Testing", completed=False,
+                           duties=[SimpleNamespace(id="d1", duty_name="Write tests")])
+    load_coins = CountingLoader([coin])
+    template = environment.get_template("index.html")
+
+    first = template.render(index_context(load_coins))
+    second = template.render(index_context(load_coins))
+
+    assert first == second
+    assert "Testing" in first and 'href="/duties/d1"' in first
+    assert load_coins.calls == 1
+
+    template.render(index_context(load_coins, version=2))
+    assert load_coins.calls == 2
+
+def test_index_caches_signed_in_view_separately(environment):
+    coin = SimpleNamespace(id="c1", coin_name="Testing", completed=True, duties=[])
+    load_coins = CountingLoader([coin])
+    template = environment.get_template("index.html")
+
+    anonymous = template.render(index_context(load_coins))
+    signed_in = template.render(index_context(load_coins, role="authenticated"))
+    admin = template.render(index_context(load_coins, role="admin"))
+
+    assert "✅ Completed" in anonymous and "toggle_completion" not in anonymous
+    assert "toggle_completion" in signed_in
+    assert load_coins.calls == 2
+    assert admin.count("toggle_completion") == 1
+
+def test_index_rerenders_after_completion_changes(environment):
+    load_coins = CountingLoader([])
+    template = environment.get_template("index.html")
+
+    template.render(index_context(load_coins, role="authenticated"))
+    template.render(index_context(load_coins, role="authenticated", completions_version=1))
+
+    assert load_coins.calls == 2
+
+def test_duty_detail_is_cached_per_duty(environment):
+    def duty(name):
+        return SimpleNamespace(duty_name=name, description="", ksbs=[])
+
+    loaders = {"d1": CountingLoader((duty("First"), [])), "d2": CountingLoader((duty("Second"), []))}
+    template = environment.get_template("duty_detail.html")
+
+    def render(duty_id, version=1):
+        return template.render(load_duty=loaders[duty_id], duty_id=duty_id, version=version)
+
+    assert "Duty: First" in render("d1")
+    assert "Duty: Second" in render("d2")
+    assert "Duty: First" in render("d1")
+    assert [loader.calls for loader in loaders.values()] == [1, 1]
+
+    render("d1", version=2)
+    assert loaders["d1"].calls == 2
+
+def test_duty_pages_keep_the_index_fragment_cached(environment):
+    environment.fragment_cache.max_size = 2
+    load_coins = CountingLoader([])
+    index = environment.get_template("index.html")
+    duty_detail = environment.get_template("duty_detail.html")
+
+    index.render(index_context(load_coins))
+    for duty_id in range(5):
+        load_duty = CountingLoader((SimpleNamespace(duty_name=duty_id, description="", ksbs=[]), []))
+        duty_detail.render(load_duty=load_duty, duty_id=str(duty_id), version=1)
+    index.render(index_context(load_coins))
+
+    assert load_coins.calls == 1
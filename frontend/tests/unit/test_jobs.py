@@ -0,0 +1,212 @@
+import sqlite3
+import time
+from threading import Event
+
+import pytest
+
+from jobs import JobQueue
+
+class FakeBackend:
+    # Answers each call with the next queued response, then with 200
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, method, path, payload):
+        self.calls.append((method, path, payload, time.monotonic()))
+        response = self.responses.pop(0) if self.responses else (200, "")
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def sent(self):
+        return [(method, path, payload) for method, path, payload, _ in self.calls]
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite")
+
+def make_queue(path, backend, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return JobQueue(path, backend, **kwargs)
+
+def test_jobs_are_sent_in_submission_order(queue_path):
+    backend = FakeBackend()
+    queue = make_queue(queue_path, backend)
+
+    ids = [queue.submit("POST", "coins", {"coin_name": name}) for name in ["A", "B", "C"]]
+    queue.start()
+
+    assert queue.wait(ids[-1], 5)["status"] == "done"
+    assert backend.sent() == [("POST", "coins", {"coin_name": name}) for name in ["A", "B", "C"]]
+    assert queue.counts() == {"done": 3}
+
+def test_a_retried_job_holds_back_later_jobs(queue_path):
+    backend = FakeBackend((503, "Unavailable"), (503, "Unavailable"))
+    queue = make_queue(queue_path, backend)
+
+    first = queue.submit("PUT", "coins/1", {"coin_name": "A"})
+    second = queue.submit("DELETE", "duties/1")
+    queue.start()
+
+    assert queue.wait(second, 5)["status"] == "done"
+    assert backend.sent() == [("PUT", "coins/1", {"coin_name": "A"})] * 3 + [("DELETE", "duties/1", None)]
+    assert queue.get(first)["attempts"] == 3
+
+def test_retries_back_off_exponentially(queue_path):
+    backend = FakeBackend((500, ""), (500, ""), (500, ""))
+    queue = make_queue(queue_path, backend, backoff=0.05)
+
+    job_id = queue.submit("POST", "coins", {})
+    queue.start()
+
+    assert queue.wait(job_id, 5)["status"] == "done"
+    times = [call[3] for call in backend.calls]
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert gaps[0] >= 0.05
+    assert gaps[1] >= 0.1
+    assert gaps[2] >= 0.2
+
+def test_backoff_is_capped(queue_path):
+    backend = FakeBackend((500, ""), (500, ""), (500, ""))
+    queue = make_queue(queue_path, backend, backoff=0.1, max_backoff=0.1)
+
+    job_id = queue.submit("POST", "coins", {})
+    queue.start()
+    queue.wait(job_id, 5)
+
+    times = [call[3] for call in backend.calls]
+    assert 0.1 <= times[3] - times[2] < 0.3
+
+@pytest.mark.parametrize("status_code", [429, 500, 503])
+def test_retryable_statuses_fail_after_max_attempts(queue_path, status_code):
+    backend = FakeBackend(*[(status_code, "Try later")] * 3)
+    queue = make_queue(queue_path, backend, max_attempts=3)
+
+    job_id = queue.submit("POST", "coins", {})
+    queue.start()
+    job = queue.wait(job_id, 5)
+
+    assert job["status"] == "failed"
+    assert job["attempts"] == 3
+    assert job["error"] == f"{status_code}: Try later"
+    assert len(backend.calls) == 3
+
+@pytest.mark.parametrize("status_code", [400, 404, 409])
+def test_client_errors_fail_without_retrying(queue_path, status_code):
+    backend = FakeBackend((status_code, "Bad request"))
+    queue = make_queue(queue_path, backend)
+
+    job_id = queue.submit("PUT", "coins/1", {"coin_name": "A"})
+    queue.start()
+    job = queue.wait(job_id, 5)
+
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    assert job["error"] == f"{status_code}: Bad request"
+
+def test_connection_errors_are_retried(queue_path):
+    backend = FakeBackend(ConnectionError("Connection refused"))
+    queue = make_queue(queue_path, backend)
+
+    job_id = queue.submit("POST", "coins", {})
+    queue.start()
+    job = queue.wait(job_id, 5)
+
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+
+def test_later_edits_replace_pending_edits(queue_path):
+    backend = FakeBackend()
+    queue = make_queue(queue_path, backend)
+
+    first = queue.submit("PUT", "coins/1", {"coin_name": "A"})
+    other = queue.submit("PUT", "coins/2", {"coin_name": "B"})
+    last = queue.submit("PUT", "coins/1", {"coin_name": "C"})
+    queue.start()
+    queue.wait(last, 5)
+
+    assert queue.get(first)["status"] == "superseded"
+    assert queue.get(first)["superseded_by"] == last
+    assert backend.sent() == [("PUT", "coins/2", {"coin_name": "B"}), ("PUT", "coins/1", {"coin_name": "C"})]
+    assert queue.get(other)["status"] == "done"
+
+def test_a_delete_replaces_pending_edits(queue_path):
+    backend = FakeBackend()
+    queue = make_queue(queue_path, backend)
+
+    edit = queue.submit("PUT", "coins/1", {"coin_name": "A"})
+    delete = queue.submit("DELETE", "coins/1")
+    queue.start()
+    queue.wait(delete, 5)
+
+    assert queue.get(edit)["status"] == "superseded"
+    assert backend.sent() == [("DELETE", "coins/1", None)]
+
+def test_an_edit_does_not_replace_a_pending_delete(queue_path):
+    backend = FakeBackend()
+    queue = make_queue(queue_path, backend)
+
+    delete = queue.submit("DELETE", "coins/1")
+    edit = queue.submit("PUT", "coins/1", {"coin_name": "A"})
+    queue.start()
+    queue.wait(edit, 5)
+
+    assert queue.get(delete)["status"] == "done"
+    assert backend.sent() == [("DELETE", "coins/1", None), ("PUT", "coins/1", {"coin_name": "A"})]
+
+def test_creates_are_never_replaced(queue_path):
+    backend = FakeBackend()
+    queue = make_queue(queue_path, backend)
+
+    queue.submit("POST", "coins", {"coin_name": "A"})
+    last = queue.submit("POST", "coins", {"coin_name": "B"})
+    queue.start()
+    queue.wait(last, 5)
+
+    assert len(backend.calls) == 2
+
+def test_jobs_left_running_are_resumed_after_a_restart(queue_path):
+    make_queue(queue_path, FakeBackend()).submit("POST", "coins", {"coin_name": "A"})
+    connection = sqlite3.connect(queue_path)
+    connection.execute("UPDATE jobs SET status = 'running'")
+    connection.commit()
+    connection.close()
+
+    backend = FakeBackend()
+    queue = make_queue(queue_path, backend)
+    queue.start()
+
+    assert queue.wait(1, 5)["status"] == "done"
+    assert backend.sent() == [("POST", "coins", {"coin_name": "A"})]
+
+def test_pending_jobs_survive_a_restart(queue_path):
+    make_queue(queue_path, FakeBackend()).submit("DELETE", "coins/1")
+
+    backend = FakeBackend()
+    queue = make_queue(queue_path, backend)
+    queue.start()
+
+    assert queue.wait(1, 5)["status"] == "done"
+    assert backend.sent() == [("DELETE", "coins/1", None)]
+
+def test_on_done_is_called_for_successful_jobs_only(queue_path):
+    finished = []
+    called = Event()
+    backend = FakeBackend((404, "Not Found"))
+    queue = make_queue(queue_path, backend, on_done=lambda job: (finished.append(job["id"]), called.set()))
+
+    failed = queue.submit("DELETE", "coins/1")
+    done = queue.submit("POST", "coins", {})
+    queue.start()
+
+    assert called.wait(5)
+    assert queue.get(failed)["status"] == "failed"
+    assert finished == [done]
+
+def test_wait_returns_the_unfinished_job_after_the_timeout(queue_path):
+    queue = make_queue(queue_path, FakeBackend())
+
+    job_id = queue.submit("POST", "coins", {})
+
+    assert queue.wait(job_id, 0.01)["status"] == "pending"